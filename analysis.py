@@ -0,0 +1,258 @@
+import argparse
+import csv
+import os
+import shlex
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from engine_pool import EnginePool
+from evaluation import MATE_CENTIPAWNS, score_to_centipawns, win_probability
+from evaluation_cache import EvaluationCache
+from pgn import PGNGame, read_games
+from uci_engine import EngineError
+from position import Position, STARTING_FEN
+
+
+ANALYSIS_DEPTH = 12
+
+# A move losing at least this much winning probability for the side that played it is flagged as a blunder
+BLUNDER_THRESHOLD = 0.15
+
+# Game endings that only depend on the position, which the rule engine scores instead of the engine
+POSITION_TERMINATIONS = ('checkmate', 'stalemate', 'insufficient_material')
+
+CSV_FIELDS = ['game', 'ply', 'move', 'color', 'fen', 'centipawns', 'win_probability', 'win_probability_loss', 'blunder']
+
+
+def replay_positions(uci_moves, start_fen=STARTING_FEN):
+    """
+    Plays the UCI moves through the rule engine and returns the (FEN, Outcome) of the position before the first move
+    and after each move. Raises ValueError at the first illegal move.
+    """
+    position = Position(start_fen)
+    outcome = position.check_for_outcome()
+    positions = [(position.to_fen(), outcome)]
+
+    for ply, uci_move in enumerate(uci_moves, start=1):
+        move = position.uci_to_move(uci_move)
+        if move not in outcome.legal_moves:
+            raise ValueError(f"Illegal move '{uci_move}' at ply {ply}")
+
+        position.play_move(move)
+        outcome = position.check_for_outcome()
+        positions.append((position.to_fen(), outcome))
+
+    return positions
+
+
+def terminal_score(fen, outcome=None):
+    """
+    Returns the white centipawn score of a position the game cannot go on from (checkmate, stalemate or
+    insufficient material), or None otherwise. Engines report these positions inconsistently, so the rule engine scores them itself.
+    Fifty move and repetition draws are left to the engine, as they only end the game when a player claims them.
+    The outcome of the position is worked out from the FEN unless it is given.
+    """
+    if outcome is None:
+        outcome = Position(fen).check_for_outcome()
+
+    if outcome.termination not in POSITION_TERMINATIONS:
+        return None
+    if outcome.termination == 'checkmate':
+        return MATE_CENTIPAWNS if outcome.result == '1-0' else -MATE_CENTIPAWNS
+    return 0
+
+
+def evaluate_position(fen, pool, depth, cache=None, outcome=None):
+    """
+    Returns a Future of the white centipawn score of the position, from the cache when it holds a deep enough result.
+    """
+    future = Future()
+
+    score = terminal_score(fen, outcome)
+    if score is None and cache is not None:
+        cached = cache.get(fen, depth)
+        score = cached[1] if cached is not None else None
+
+    if score is not None:
+        future.set_result(score)
+        return future
+
+    side_to_move = fen.split()[1]
+
+    def engine_done(engine_future):
+        # Runs in the pool's worker thread once the engine has finished the position
+        try:
+            info = engine_future.result()
+        except Exception as error:
+            future.set_exception(error)
+            return
+
+        if info is None:
+            future.set_exception(ValueError(f"The engine reported no score for '{fen}'"))
+            return
+
+        centipawns = score_to_centipawns(info, side_to_move)
+        if cache is not None:
+            cache.put(fen, info['depth'], centipawns)
+        future.set_result(centipawns)
+
+    pool.submit(fen, depth).add_done_callback(engine_done)
+    return future
+
+
+def submit_game(uci_moves, pool, depth=ANALYSIS_DEPTH, cache=None, start_fen=STARTING_FEN):
+    """
+    Replays the game and queues all its positions on the engine pool at once, so they are analysed in parallel.
+    Returns the pending analysis for collect_game.
+    """
+    positions = replay_positions(uci_moves, start_fen)
+    fens = [fen for fen, _ in positions]
+    futures = [evaluate_position(fen, pool, depth, cache, outcome) for fen, outcome in positions]
+    return uci_moves, fens, futures
+
+
+def collect_game(pending_game, blunder_threshold=BLUNDER_THRESHOLD):
+    """
+    Waits for the evaluations of a game queued by submit_game and returns one row per move with the score after it
+    (from white's point of view), the winning probability lost by the side that moved and whether the move was a blunder.
+    """
+    uci_moves, fens, futures = pending_game
+    scores = [future.result() for future in futures]
+
+    rows = []
+    for ply, uci_move in enumerate(uci_moves, start=1):
+        color = fens[ply - 1].split()[1]  # The side that played the move
+        before = win_probability(scores[ply - 1])
+        after = win_probability(scores[ply])
+
+        # Winning probability lost by the side that moved, from its own point of view
+        loss = before - after if color == 'w' else after - before
+        loss = max(loss, 0.0)
+
+        rows.append({
+            'ply': ply,
+            'move': uci_move,
+            'color': color,
+            'fen': fens[ply],
+            'centipawns': scores[ply],
+            'win_probability': round(after, 4),
+            'win_probability_loss': round(loss, 4),
+            'blunder': int(loss >= blunder_threshold),
+        })
+
+    return rows
+
+
+def analyze_game(uci_moves, pool, depth=ANALYSIS_DEPTH, cache=None, start_fen=STARTING_FEN, blunder_threshold=BLUNDER_THRESHOLD):
+    """
+    Analyses a game given as a list of UCI moves (e.g. Chessboard.uci_moves) and returns its per-move evaluation rows.
+    """
+    return collect_game(submit_game(uci_moves, pool, depth, cache, start_fen), blunder_threshold)
+
+
+def read_game_file(path):
+    """
+    Reads a game saved as UCI moves separated by whitespace.
+    """
+    with open(path) as file:
+        return file.read().split()
+
+
+def iterate_directory_games(directory):
+    """
+    Yields (game name, PGN game or list of UCI moves) for every game in the directory:
+    one game per .txt file of UCI moves, any number of games per .pgn file (read one at a time).
+    """
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        stem, extension = os.path.splitext(name)
+
+        if extension == '.txt':
+            yield stem, read_game_file(path)
+        elif extension == '.pgn':
+            with open(path, encoding='utf-8', errors='replace') as file:
+                for index, game in enumerate(read_games(file), start=1):
+                    yield f'{stem}:{index}', game
+
+
+def analyze_directory(directory, output_path, pool, depth=ANALYSIS_DEPTH, cache=None, games_in_flight=None):
+    """
+    Analyses every game in the directory (.txt files of UCI moves and .pgn files) and writes all the move rows to one CSV file.
+    Several games are queued on the pool at once so its engines stay busy, and rows are written as each game completes.
+    Returns the number of games analysed.
+    """
+    # Enough queued games to keep every engine busy while the oldest one is being written
+    games_in_flight = games_in_flight or 2 * pool.size
+
+    game_count = 0
+    with open(output_path, 'w', newline='') as output_file:
+        writer = csv.DictWriter(output_file, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+        pending_games = deque()
+
+        def write_oldest_game():
+            game_name, pending_game = pending_games.popleft()
+            try:
+                rows = collect_game(pending_game)
+            except (EngineError, OSError, ValueError) as error:
+                # The engine failed on one of the positions even after being restarted
+                print(f"Skipping {game_name}: {error}", file=sys.stderr)
+                return 0
+
+            for row in rows:
+                writer.writerow({'game': game_name, **row})
+            return 1
+
+        for game_name, game in iterate_directory_games(directory):
+            try:
+                if isinstance(game, PGNGame):
+                    pending_game = submit_game(game.uci_moves(), pool, depth, cache, game.start_fen)
+                else:
+                    pending_game = submit_game(game, pool, depth, cache)
+                pending_games.append((game_name, pending_game))
+            except ValueError as error:
+                print(f"Skipping {game_name}: {error}", file=sys.stderr)
+                continue
+
+            if len(pending_games) >= games_in_flight:
+                game_count += write_oldest_game()
+
+        while pending_games:
+            game_count += write_oldest_game()
+
+    return game_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a directory of games with a pool of UCI engines")
+    parser.add_argument("games", help="directory of .pgn files and .txt files of UCI moves (one game per file)")
+    parser.add_argument("output", help="CSV file to write the per-move evaluations to")
+    parser.add_argument("--engine", default="stockfish", help="path of the UCI engine binary, or a command line such as 'python fake_uci.py'")
+    parser.add_argument("--engines", type=int, default=None, help="number of engine processes (default: one per core)")
+    parser.add_argument("--depth", type=int, default=ANALYSIS_DEPTH, help="search depth of each position")
+    parser.add_argument("--hash", type=int, default=16, help="hash table size of each engine in megabytes")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before an engine stuck on a position is restarted")
+    parser.add_argument("--cache", default=None, help="evaluation cache database shared with the GUI")
+    args = parser.parse_args()
+
+    cache = EvaluationCache(args.cache) if args.cache else None
+
+    # A path that is not an existing file is taken as a command line with arguments
+    engine = args.engine if os.path.isfile(args.engine) else shlex.split(args.engine)
+
+    start_time = time.perf_counter()
+    with EnginePool(engine, size=args.engines, hash_mb=args.hash, timeout=args.timeout) as pool:
+        game_count = analyze_directory(args.games, args.output, pool, args.depth, cache)
+    elapsed = time.perf_counter() - start_time
+
+    if cache is not None:
+        cache.close()
+
+    print(f"Analysed {game_count} games in {elapsed:.1f}s ({game_count / max(elapsed, 1e-9):.2f} games/s)")
+
+
+if __name__ == "__main__":
+    main()
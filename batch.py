@@ -0,0 +1,295 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from bitboard import *
+from position import EMPTY_SQUARE_RUNS, FEN_SQUARE_CHARACTERS, Position
+from pgn import REFERENCE_FILE, read_games
+
+
+# Batch versions of the bitboard attack computations, working on many positions at once.
+# Boards are (N, 64) int8 arrays of the piece codes of bitboard.py (square = row * 8 + col, a8 = 0),
+# and every bitboard is an (N,) uint64 array holding one 64-bit board per position.
+
+ALL_SQUARES = np.uint64(0xFFFFFFFFFFFFFFFF)
+NO_SQUARES = np.uint64(0)
+
+FILE_A = 0x0101010101010101  # col 0
+FILE_H = 0x8080808080808080  # col 7
+RANK_8 = 0x00000000000000FF  # row 0
+RANK_1 = 0xFF00000000000000  # row 7
+RANK_6 = 0x0000000000FF0000  # row 2, reached by a black pawn's first single push
+RANK_3 = 0x0000FF0000000000  # row 5, reached by a white pawn's first single push
+
+
+def wrap_mask(col_step):
+    """
+    Returns the squares a bitboard shifted by col_step columns may land on,
+    removing the files that a shift wraps around to from the other edge of the board.
+    """
+    mask = 0xFFFFFFFFFFFFFFFF
+    for step in range(abs(col_step)):
+        mask &= ~((FILE_A << step) if col_step > 0 else (FILE_H >> step))
+    return np.uint64(mask & 0xFFFFFFFFFFFFFFFF)
+
+
+# (shift, wrap mask) of every (row, col) offset, a positive shift moves bits to higher squares
+SHIFTS = {
+    (row_step, col_step): (row_step * CHESSBOARD_SIZE + col_step, wrap_mask(col_step))
+    for row_step in range(-2, 3) for col_step in range(-2, 3)
+}
+
+
+def shift(bitboards, offset):
+    """
+    Moves every bit of the bitboards by the (row, col) offset, dropping bits that leave the board.
+    """
+    amount, mask = SHIFTS[offset]
+    if amount > 0:
+        return (bitboards << np.uint64(amount)) & mask
+    return (bitboards >> np.uint64(-amount)) & mask
+
+
+def fill_sliding_attacks(sliders, empty, direction):
+    """
+    Returns the squares attacked by the sliders in one (row, col) direction, stopping at (and including) the first occupied square.
+    Uses a Kogge-Stone fill, which slides every piece of every position at once in three doubling steps.
+    """
+    amount, mask = SHIFTS[direction]
+    amount = np.uint64(abs(amount))
+    forward = direction[0] * CHESSBOARD_SIZE + direction[1] > 0
+
+    # Squares the fill may pass through: empty, and not wrapped around from the other edge
+    propagator = empty & mask
+    for step in (1, 2, 4):
+        step_amount = amount * np.uint64(step)
+        if forward:
+            sliders = sliders | propagator & (sliders << step_amount)
+            propagator = propagator & (propagator << step_amount)
+        else:
+            sliders = sliders | propagator & (sliders >> step_amount)
+            propagator = propagator & (propagator >> step_amount)
+
+    # One more step onto the first blocker
+    return shift(sliders, direction)
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(bitboards):
+        """
+        Returns the number of set bits of each bitboard.
+        """
+        return np.bitwise_count(bitboards).astype(np.int32)
+else:
+    def popcount(bitboards):
+        """
+        Returns the number of set bits of each bitboard (SWAR bit counting, for numpy versions without bitwise_count).
+        """
+        bitboards = bitboards - ((bitboards >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        bitboards = (bitboards & np.uint64(0x3333333333333333)) + ((bitboards >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        bitboards = (bitboards + (bitboards >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return ((bitboards * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int32)
+
+
+def encode_fen(fen):
+    """
+    Returns the 64 piece codes of the piece placement of a FEN, without setting up a full Position.
+    """
+    placement = fen.split()[0]
+    ranks = placement.translate(EMPTY_SQUARE_RUNS).split('/')
+    board_string = ''.join(ranks)
+    if len(ranks) != CHESSBOARD_SIZE or len(board_string) != CHESSBOARD_SIZE * CHESSBOARD_SIZE \
+            or not set(board_string) <= FEN_SQUARE_CHARACTERS:
+        raise ValueError(f"Invalid FEN piece placement: '{placement}'")
+    return board_string.encode().translate(FEN_TO_CODES)
+
+
+def encode_positions(positions):
+    """
+    Returns the (N, 64) int8 board array of a sequence of Positions (or Chessboards) and FEN strings.
+    """
+    data = b''.join(encode_fen(position) if isinstance(position, str) else bytes(position.squares) for position in positions)
+    return np.frombuffer(data, dtype=np.int8).reshape(-1, CHESSBOARD_SIZE * CHESSBOARD_SIZE)
+
+
+def piece_bitboards(boards):
+    """
+    Returns {notation: (N,) uint64 bitboards} of every piece of an (N, 64) board array.
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+
+    # Pack each of the four bits of the piece codes into a bitboard (square 0 in the lowest bit),
+    # then pick out each code by combining the planes, which touches the board array four times instead of twelve
+    planes = []
+    for bit in range(4):
+        packed = np.packbits((boards >> bit) & 1, axis=1, bitorder='little')
+        planes.append(np.ascontiguousarray(packed).view('<u8').ravel().astype(np.uint64))
+
+    pieces = {}
+    for notation in PIECE_NOTATIONS:
+        code = PIECE_CODES[notation]
+        bitboards = ALL_SQUARES
+        for bit, plane in enumerate(planes):
+            bitboards = bitboards & (plane if code >> bit & 1 else ~plane)
+        pieces[notation] = bitboards
+    return pieces
+
+
+def side_attacks(pieces, color, empty, own):
+    """
+    Returns the squares attacked by one color and the number of pseudo-legal moves of its pieces.
+    Moves are counted per piece: a shift or a sliding direction never maps two pieces onto the same square,
+    so summing the destinations of each offset and direction counts every (piece, destination) pair once.
+    Castling and en passant are not counted (the board array holds no castling rights or en passant square),
+    and a promotion counts once per destination square.
+    """
+    pawn, knight, bishop, rook, queen, king = 'PNBRQK' if color == 'w' else 'pnbrqk'
+    opponent = ~(own | empty)
+    not_own = ~own
+
+    attacks = NO_SQUARES
+    mobility = 0
+
+    # Pawns capture diagonally forwards and push to empty squares, two squares from their starting rank
+    forward = -1 if color == 'w' else 1
+    for col_step in (-1, 1):
+        pawn_attacks = shift(pieces[pawn], (forward, col_step))
+        attacks = attacks | pawn_attacks
+        mobility = mobility + popcount(pawn_attacks & opponent)
+
+    single_pushes = shift(pieces[pawn], (forward, 0)) & empty
+    double_pushes = shift(single_pushes & np.uint64(RANK_3 if color == 'w' else RANK_6), (forward, 0)) & empty
+    mobility = mobility + popcount(single_pushes) + popcount(double_pushes)
+
+    for offsets, piece in ((KNIGHT_OFFSETS, knight), (KING_OFFSETS, king)):
+        for offset in offsets:
+            piece_attacks = shift(pieces[piece], offset)
+            attacks = attacks | piece_attacks
+            mobility = mobility + popcount(piece_attacks & not_own)
+
+    for directions, sliders in ((BISHOP_DIRECTIONS, pieces[bishop] | pieces[queen]), (ROOK_DIRECTIONS, pieces[rook] | pieces[queen])):
+        for direction in directions:
+            slider_attacks = fill_sliding_attacks(sliders, empty, direction)
+            attacks = attacks | slider_attacks
+            mobility = mobility + popcount(slider_attacks & not_own)
+
+    return attacks, mobility
+
+
+def analyse_boards(boards, white_to_move=None):
+    """
+    Computes, for every position of an (N, 64) int8 board array at once:
+    the squares attacked by each color ('white_attacks', 'black_attacks', as uint64 bitboards),
+    whether each king is in check ('white_in_check', 'black_in_check')
+    and the number of pseudo-legal moves of each color ('white_mobility', 'black_mobility', see side_attacks).
+    When white_to_move (a bool per position) is given, 'legal' also flags the positions that could arise in a game:
+    one king per color, no pawns on the first or last rank and the side that just moved not left in check.
+    """
+    pieces = piece_bitboards(boards)
+    white = pieces['P'] | pieces['N'] | pieces['B'] | pieces['R'] | pieces['Q'] | pieces['K']
+    black = pieces['p'] | pieces['n'] | pieces['b'] | pieces['r'] | pieces['q'] | pieces['k']
+    empty = ~(white | black)
+
+    white_attacks, white_mobility = side_attacks(pieces, 'w', empty, white)
+    black_attacks, black_mobility = side_attacks(pieces, 'b', empty, black)
+
+    results = {
+        'white_attacks': white_attacks,
+        'black_attacks': black_attacks,
+        'white_in_check': (pieces['K'] & black_attacks) != 0,
+        'black_in_check': (pieces['k'] & white_attacks) != 0,
+        'white_mobility': white_mobility,
+        'black_mobility': black_mobility,
+    }
+
+    if white_to_move is not None:
+        white_to_move = np.asarray(white_to_move, dtype=bool)
+        pawns_on_back_ranks = (pieces['P'] | pieces['p']) & np.uint64(RANK_8 | RANK_1)
+        results['legal'] = (
+            (popcount(pieces['K']) == 1) & (popcount(pieces['k']) == 1) & (pawns_on_back_ranks == 0)
+            & np.where(white_to_move, ~results['black_in_check'], ~results['white_in_check'])
+        )
+
+    return results
+
+
+def reference_analysis(position):
+    """
+    Computes the analyse_boards results of one position with the scalar Bitboards code, to check the batch version against.
+    """
+    bitboards = position.bitboards
+    results = {}
+    for color, name in (('w', 'white'), ('b', 'black')):
+        own = bitboards.occupancy[color]
+        opponent = bitboards.occupancy['b' if color == 'w' else 'w']
+        occupied = own | opponent
+        mobility = 0
+        for notation in (PIECE_NOTATIONS[:6] if color == 'w' else PIECE_NOTATIONS[6:]):
+            for square in iterate_squares(bitboards.pieces[notation]):
+                if notation in 'Pp':
+                    mobility += bin(bitboards.attacks_from(square, notation) & opponent).count('1')
+                    row, col = square_coord(square)
+                    step = -1 if color == 'w' else 1
+                    if 0 <= row + step < CHESSBOARD_SIZE and not occupied >> square_index(row + step, col) & 1:
+                        mobility += 1
+                        if row == (6 if color == 'w' else 1) and not occupied >> square_index(row + 2 * step, col) & 1:
+                            mobility += 1
+                else:
+                    mobility += bin(bitboards.attacks_from(square, notation, occupied) & ~own).count('1')
+
+        king_square = bitboards.king_square(color)
+        results[f'{name}_attacks'] = bitboards.attacked_squares(color)
+        results[f'{name}_in_check'] = king_square is not None and bitboards.is_square_attacked(king_square, 'b' if color == 'w' else 'w')
+        results[f'{name}_mobility'] = mobility
+    return results
+
+
+def reference_positions(path=REFERENCE_FILE):
+    """
+    Returns every position reached in the games of a PGN file, as a list of Positions.
+    """
+    positions = []
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for game in read_games(file):
+            position = Position(game.start_fen)
+            positions.append(Position(position.to_fen()))
+            for uci_move in game.uci_moves():
+                position.play_move(position.uci_to_move(uci_move))
+                positions.append(Position(position.to_fen()))
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch attack map, check and mobility benchmark over the positions of a PGN file")
+    parser.add_argument("path", nargs='?', default=REFERENCE_FILE, help="PGN file whose positions are analysed (default: the reference games)")
+    parser.add_argument("--count", type=int, default=1000000, help="number of positions per batch (the file's positions are repeated to fill it)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed batches")
+    args = parser.parse_args()
+
+    positions = reference_positions(args.path)
+
+    # Check the batch results against the scalar bitboard code on every distinct position
+    results = analyse_boards(encode_positions(positions))
+    mismatches = 0
+    for index, position in enumerate(positions):
+        for key, expected in reference_analysis(position).items():
+            if int(results[key][index]) != int(expected):
+                mismatches += 1
+                print(f"Mismatch in {key} for '{position.to_fen()}': {results[key][index]} != {expected}", file=sys.stderr)
+    print(f"Checked {len(positions)} positions against the scalar code, {mismatches} mismatches")
+
+    boards = np.resize(encode_positions(positions), (args.count, CHESSBOARD_SIZE * CHESSBOARD_SIZE))
+    white_to_move = np.resize(np.array([position.current_player == 'w' for position in positions]), args.count)
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        analyse_boards(boards, white_to_move)
+        elapsed = time.perf_counter() - start_time
+        print(f"{args.count} positions in {elapsed:.3f}s ({args.count / max(elapsed, 1e-9):.0f} positions/s)")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
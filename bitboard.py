@@ -0,0 +1,362 @@
+# Bitboards use one bit per square, square = row * 8 + col (a8 = 0, h1 = 63)
+CHESSBOARD_SIZE = 8
+PIECE_NOTATIONS = 'PNBRQKpnbrqk'
+
+# Small integer piece codes stored one byte per square: the piece type in the low three bits and the color in bit 3
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+BLACK = 8
+PIECE_TYPE_MASK = 7
+
+PIECE_CODES = {notation: index % 6 + 1 | (BLACK if notation.islower() else 0) for index, notation in enumerate(PIECE_NOTATIONS)}
+
+# The notation of each piece code (None for the empty square and unused codes)
+CODE_NOTATIONS = [None] * 16
+for _notation, _code in PIECE_CODES.items():
+    CODE_NOTATIONS[_code] = _notation
+
+# Byte translation tables between FEN characters (' ' for an empty square) and piece codes
+FEN_TO_CODES = bytes.maketrans((' ' + PIECE_NOTATIONS).encode(), bytes([EMPTY] + [PIECE_CODES[notation] for notation in PIECE_NOTATIONS]))
+CODES_TO_FEN = bytes.maketrans(bytes([EMPTY] + [PIECE_CODES[notation] for notation in PIECE_NOTATIONS]), (' ' + PIECE_NOTATIONS).encode())
+
+# Define the move generation tables as (row, col) offsets
+KNIGHT_OFFSETS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+# Sliding pieces repeat their direction until they reach the edge of the board or another piece
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def square_index(row, col):
+    """
+    Converts (row, col) coordinates to a bitboard square index.
+    """
+    return row * CHESSBOARD_SIZE + col
+
+
+def square_coord(square):
+    """
+    Converts a bitboard square index to (row, col) coordinates.
+    """
+    return divmod(square, CHESSBOARD_SIZE)
+
+
+def iterate_squares(bitboard):
+    """
+    Yields the square index of every set bit in the bitboard, lowest first.
+    """
+    while bitboard:
+        lowest_bit = bitboard & -bitboard
+        yield lowest_bit.bit_length() - 1
+        bitboard ^= lowest_bit
+
+
+def build_leaper_attacks(offsets):
+    """
+    Precomputes the attack mask of a piece that jumps by the given (row, col) offsets, for every square.
+    """
+    table = []
+    for square in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE):
+        row, col = square_coord(square)
+        attacks = 0
+        for row_step, col_step in offsets:
+            if 0 <= row + row_step < CHESSBOARD_SIZE and 0 <= col + col_step < CHESSBOARD_SIZE:
+                attacks |= 1 << square_index(row + row_step, col + col_step)
+        table.append(attacks)
+    return table
+
+
+def build_rays(direction):
+    """
+    Precomputes the ray from every square to the edge of the board in the given (row, col) direction.
+    """
+    row_step, col_step = direction
+    table = []
+    for square in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE):
+        row, col = square_coord(square)
+        ray = 0
+        row, col = row + row_step, col + col_step
+        while 0 <= row < CHESSBOARD_SIZE and 0 <= col < CHESSBOARD_SIZE:
+            ray |= 1 << square_index(row, col)
+            row, col = row + row_step, col + col_step
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = build_leaper_attacks(KNIGHT_OFFSETS)
+KING_ATTACKS = build_leaper_attacks(KING_OFFSETS)
+
+# Squares attacked by a pawn of each color, white pawns move up the board (towards row 0)
+PAWN_ATTACKS = {
+    'w': build_leaper_attacks([(-1, -1), (-1, 1)]),
+    'b': build_leaper_attacks([(1, -1), (1, 1)]),
+}
+
+# Rays are stored with a flag saying if the square index increases along them,
+# which decides whether the nearest blocker is the lowest or the highest set bit
+RAYS = {direction: build_rays(direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+ROOK_RAYS = [(RAYS[direction], direction[0] * CHESSBOARD_SIZE + direction[1] > 0) for direction in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(RAYS[direction], direction[0] * CHESSBOARD_SIZE + direction[1] > 0) for direction in BISHOP_DIRECTIONS]
+
+
+def build_between():
+    """
+    Precomputes, for every pair of squares on the same rank, file or diagonal, the squares strictly between them.
+    """
+    table = [[0] * (CHESSBOARD_SIZE * CHESSBOARD_SIZE) for _ in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE)]
+    for direction, ray_table in RAYS.items():
+        for square in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE):
+            # Walk along the ray, the squares passed so far are between the start and the current square
+            between = 0
+            for target in sorted(iterate_squares(ray_table[square]), key=lambda target: abs(target - square)):
+                table[square][target] = between
+                between |= 1 << target
+    return table
+
+
+BETWEEN = build_between()
+
+
+def sliding_attacks(square, occupied, rays):
+    """
+    Returns the squares attacked along the given rays, stopping at (and including) the first occupied square.
+    """
+    attacks = 0
+    for ray_table, increasing in rays:
+        ray = ray_table[square]
+        blockers = ray & occupied
+        if blockers:
+            # Find the nearest blocker and remove everything behind it from the ray
+            blocker = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+            ray ^= ray_table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    """
+    Returns the squares attacked by a rook on the square.
+    """
+    return sliding_attacks(square, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(square, occupied):
+    """
+    Returns the squares attacked by a bishop on the square.
+    """
+    return sliding_attacks(square, occupied, BISHOP_RAYS)
+
+
+def queen_attacks(square, occupied):
+    """
+    Returns the squares attacked by a queen on the square.
+    """
+    return sliding_attacks(square, occupied, ROOK_RAYS) | sliding_attacks(square, occupied, BISHOP_RAYS)
+
+
+def knight_attacks(square, occupied):
+    """
+    Returns the squares attacked by a knight on the square.
+    """
+    return KNIGHT_ATTACKS[square]
+
+
+def king_attacks(square, occupied):
+    """
+    Returns the squares attacked by a king on the square.
+    """
+    return KING_ATTACKS[square]
+
+
+# Attack function of each piece type, indexed by type code (pawn attacks depend on the color and are looked up separately)
+PIECE_TYPE_ATTACKS = [None, None, knight_attacks, bishop_attacks, rook_attacks, queen_attacks, king_attacks]
+
+
+class Bitboards:
+
+    def __init__(self):
+        """
+        Initializes an empty position with one bitboard per piece plus the occupancy of each color.
+        """
+        self.pieces = dict.fromkeys(PIECE_NOTATIONS, 0)  # One 64-bit integer per piece notation
+        self.occupancy = {'w': 0, 'b': 0}  # All the squares occupied by each color
+
+
+    @classmethod
+    def from_squares(cls, squares):
+        """
+        Builds the bitboards of 64 piece codes (EMPTY for an empty square) in one pass.
+        """
+        bitboards = cls()
+        pieces = bitboards.pieces
+        for square, code in enumerate(squares):
+            if code:
+                pieces[CODE_NOTATIONS[code]] |= 1 << square
+
+        for notation, bitboard in pieces.items():
+            bitboards.occupancy['w' if notation.isupper() else 'b'] |= bitboard
+
+        return bitboards
+
+
+    def copy(self):
+        """
+        Returns an independent copy of the bitboards.
+        """
+        bitboards = Bitboards()
+        bitboards.pieces = self.pieces.copy()
+        bitboards.occupancy = self.occupancy.copy()
+        return bitboards
+
+
+    @property
+    def occupied(self):
+        """
+        Returns the squares occupied by either color.
+        """
+        return self.occupancy['w'] | self.occupancy['b']
+
+
+    def add_piece(self, square, notation):
+        """
+        Places a piece on the square.
+        """
+        bit = 1 << square
+        self.pieces[notation] |= bit
+        self.occupancy['w' if notation.isupper() else 'b'] |= bit
+
+
+    def remove_piece(self, square, notation):
+        """
+        Removes a piece from the square.
+        """
+        bit = 1 << square
+        self.pieces[notation] &= ~bit
+        self.occupancy['w' if notation.isupper() else 'b'] &= ~bit
+
+
+    def king_square(self, color):
+        """
+        Returns the square of the king of the specified color, or None if it is not on the board.
+        """
+        king = self.pieces['K' if color == 'w' else 'k']
+        return king.bit_length() - 1 if king else None
+
+
+    def attacks_from(self, square, notation, occupied=None):
+        """
+        Returns the squares attacked by the given piece standing on the square.
+        """
+        if occupied is None:
+            occupied = self.occupied
+
+        code = PIECE_CODES[notation]
+        if code & PIECE_TYPE_MASK == PAWN:
+            return PAWN_ATTACKS['b' if code & BLACK else 'w'][square]
+        return PIECE_TYPE_ATTACKS[code & PIECE_TYPE_MASK](square, occupied)
+
+
+    def is_square_attacked(self, square, by_color, occupied=None):
+        """
+        Checks if any piece of the specified color attacks the square, looking outward from the square
+        along the knight, king and pawn offsets and the sliding rays instead of building a full attack map.
+        """
+        if occupied is None:
+            occupied = self.occupied
+
+        pieces = self.pieces
+        pawn, knight, bishop, rook, queen, king = 'PNBRQK' if by_color == 'w' else 'pnbrqk'
+
+        # A pawn attacks the square if a pawn of the other color on the square would attack the pawn back
+        if PAWN_ATTACKS['b' if by_color == 'w' else 'w'][square] & pieces[pawn]:
+            return True
+
+        if KNIGHT_ATTACKS[square] & pieces[knight] or KING_ATTACKS[square] & pieces[king]:
+            return True
+
+        # Sliding pieces attack the square if they are the first piece along a ray from it
+        diagonal_sliders = pieces[bishop] | pieces[queen]
+        if diagonal_sliders and bishop_attacks(square, occupied) & diagonal_sliders:
+            return True
+
+        straight_sliders = pieces[rook] | pieces[queen]
+        return bool(straight_sliders and rook_attacks(square, occupied) & straight_sliders)
+
+
+    def attackers_to(self, square, by_color, occupied=None):
+        """
+        Returns the squares of all the pieces of the specified color that attack the square.
+        """
+        if occupied is None:
+            occupied = self.occupied
+
+        pieces = self.pieces
+        pawn, knight, bishop, rook, queen, king = 'PNBRQK' if by_color == 'w' else 'pnbrqk'
+
+        return (
+            PAWN_ATTACKS['b' if by_color == 'w' else 'w'][square] & pieces[pawn]
+            | KNIGHT_ATTACKS[square] & pieces[knight]
+            | KING_ATTACKS[square] & pieces[king]
+            | bishop_attacks(square, occupied) & (pieces[bishop] | pieces[queen])
+            | rook_attacks(square, occupied) & (pieces[rook] | pieces[queen])
+        )
+
+
+    def en_passant_capturers(self, en_passant_square, color):
+        """
+        Returns the squares of the pawns of the specified color that can capture en passant on the square.
+        Used by both the move generator and the Zobrist hash, so a usable en passant square is decided in one place.
+        """
+        # The capturing pawns stand on the squares an opponent's pawn would attack from the en passant square
+        return PAWN_ATTACKS['b' if color == 'w' else 'w'][en_passant_square] & self.pieces['P' if color == 'w' else 'p']
+
+
+    def pinned_pieces(self, king_square, color):
+        """
+        Finds the pieces of the specified color pinned to their king, returned as {square: pin ray},
+        where the pin ray holds the squares the pinned piece can still move to (up to and including the pinner).
+        """
+        occupied = self.occupied
+        own_pieces = self.occupancy[color]
+        # Only the opponent's sliding pieces can pin
+        bishop, rook, queen = 'brq' if color == 'w' else 'BRQ'
+        diagonal_pinners = self.pieces[bishop] | self.pieces[queen]
+        straight_pinners = self.pieces[rook] | self.pieces[queen]
+
+        pins = {}
+        for rays, pinners in ((BISHOP_RAYS, diagonal_pinners), (ROOK_RAYS, straight_pinners)):
+            if not pinners:
+                continue
+
+            for ray_table, increasing in rays:
+                blockers = ray_table[king_square] & occupied
+                if not blockers:
+                    continue
+
+                # The nearest piece along the ray can only be pinned if it is one of the player's own pieces
+                nearest = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+                if not own_pieces >> nearest & 1:
+                    continue
+
+                # It is pinned if the next piece along the ray is an opponent's slider moving in this direction
+                blockers ^= 1 << nearest
+                if not blockers:
+                    continue
+                pinner = (blockers & -blockers).bit_length() - 1 if increasing else blockers.bit_length() - 1
+                if pinners >> pinner & 1:
+                    pins[nearest] = BETWEEN[king_square][pinner] | 1 << pinner
+
+        return pins
+
+
+    def attacked_squares(self, color):
+        """
+        Returns every square attacked by the pieces of the specified color.
+        """
+        occupied = self.occupied
+        attacks = 0
+        for notation in (PIECE_NOTATIONS[:6] if color == 'w' else PIECE_NOTATIONS[6:]):
+            for square in iterate_squares(self.pieces[notation]):
+                attacks |= self.attacks_from(square, notation, occupied)
+        return attacks
@@ -1,30 +1,42 @@
 import pygame
 import sys
-import numpy as np
 import os
-import math
 
 from config import *
+from pgn import read_games, write_game
+from position import *
+from sprites import SPRITES
 
 
-class Chessboard:
+class Chessboard(Position):
 
-    def __init__(self, window):
-        self.board = np.empty((CHESSBOARD_SIZE, CHESSBOARD_SIZE), dtype=object)
-        self.window = window
-        self.current_player = 'w'  # 'w' for white, 'b' for black
+    def __init__(self, window=None, fen=STARTING_FEN):
+        Position.__init__(self, fen)  # The rule engine state, the board grid below is only the view used for drawing
+        self.board = [[None] * CHESSBOARD_SIZE for _ in range(CHESSBOARD_SIZE)]  # Plain lists index much faster than a numpy object array
+        self.window = window  # Only needed to show the promotion dialog, positions can be set up without a display
         self.selected_piece = None
         self.selected_piece_pos = None
-        self.white_pieces = ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R', 'P', 'P', 'P', 'P', 'P', 'P', 'P', 'P']
-        self.black_pieces = ['p', 'p', 'p', 'p', 'p', 'p', 'p', 'p', 'r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
+        self.white_pieces = []
+        self.black_pieces = []
         self.white_captured_pieces = []
         self.black_captured_pieces = []
-        self.moves_since_last_pawn_move = 0
-        self.moves_since_last_capture = 0
-        self.last_boards = []  # A list to store the last few board states along with the moves made, Store tuples (board_state, moves)
         self.moves = []  # Add the moves attribute to keep track of moves made during the game
         self.uci_moves = []  # A list to store the moves in the UCI (Universal Chess Interface) notation
-        self.current_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 0"
+        self.current_fen = None
+        self.dirty_squares = set()  # The (row, col) squares that changed since they were last drawn
+        self.drawn_selection = None  # The selected square when the board was last drawn
+        self.drawn_destinations = {}  # The legal destinations of the selected piece when the board was last drawn
+
+        self.reset_view()
+
+
+    @classmethod
+    def from_fen(cls, fen, window=None):
+        """
+        Creates a chessboard set up from a FEN string: pieces, side to move, castling rights, en passant square and clocks.
+        No image is loaded, the pieces are only drawn from the shared sprite cache.
+        """
+        return cls(window, fen)
 
 
     def draw(self, surface):
@@ -32,32 +44,102 @@ class Chessboard:
         Draws chess board & chess pieces at specified positions
         """
         
-        # Draw the chessboard squares
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                x = col * SQUARE_SIZE
-                y = TOP_BAR_HEIGHT + row * SQUARE_SIZE
-                color = (139, 69, 19) if (row + col) % 2 == 0 else (169, 169, 169)
-                pygame.draw.rect(surface, color, (x, y, SQUARE_SIZE, SQUARE_SIZE))
+        self.drawn_selection = self.selected_piece_pos
+        self.drawn_destinations = self.selected_destinations()
 
-        # Draw the chess pieces on the board
+        # Draw every square with its piece
         for row in range(CHESSBOARD_SIZE):
             for col in range(CHESSBOARD_SIZE):
-                piece = self.board[row][col]
-                if piece:
-                    # Calculate the scaled size of the piece image
-                    scaled_size = int(SQUARE_SIZE * PIECE_SIZE_SCALE)
+                self.draw_square(surface, row, col)
+
+        self.dirty_squares.clear()
+
+
+    def draw_dirty(self, surface):
+        """
+        Draws only the squares that changed since the last draw and returns their screen rectangles.
+        """
+        # A change of selection redraws the squares losing the highlight and the squares gaining it,
+        # the selected square and the squares its piece can move to
+        destinations = self.selected_destinations()
+        if self.selected_piece_pos != self.drawn_selection or destinations != self.drawn_destinations:
+            for position in (self.drawn_selection, self.selected_piece_pos):
+                if position is not None:
+                    self.dirty_squares.add(position)
+            self.dirty_squares.update(self.drawn_destinations)
+            self.dirty_squares.update(destinations)
+            self.drawn_selection = self.selected_piece_pos
+            self.drawn_destinations = destinations
+
+        rects = [self.draw_square(surface, row, col) for row, col in self.dirty_squares]
+        self.dirty_squares.clear()
+
+        return rects
+
+
+    def draw_square(self, surface, row, col):
+        """
+        Draws one square of the chessboard and the piece on it, returning the square's screen rectangle.
+        """
+        x = col * SQUARE_SIZE
+        y = TOP_BAR_HEIGHT + row * SQUARE_SIZE
+
+        # The selected piece's square is highlighted
+        if (row, col) == self.selected_piece_pos:
+            color = (205, 210, 106)
+        else:
+            color = (139, 69, 19) if (row + col) % 2 == 0 else (169, 169, 169)
+        square_rect = pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE)
+        pygame.draw.rect(surface, color, square_rect)
+
+        piece = self.board[row][col]
+        if piece:
+            # Get the piece image already scaled to the square size from the sprite cache
+            scaled_image = SPRITES.board_sprite(piece.notation)
+            scaled_size = scaled_image.get_width()
+
+            # Calculate the pixel coordinates (x, y) of the piece on the board
+            x = col * SQUARE_SIZE + (SQUARE_SIZE - scaled_size) // 2
+            y = TOP_BAR_HEIGHT + row * SQUARE_SIZE + (SQUARE_SIZE - scaled_size) // 2
+
+            # Blit (draw) the scaled piece image on the board surface
+            surface.blit(scaled_image, (x, y))
+
+        # Mark the square if the selected piece can move to it, with the marker surface rendered once in the sprite cache
+        if (row, col) in self.drawn_destinations:
+            surface.blit(SPRITES.move_marker(self.drawn_destinations[(row, col)]), square_rect.topleft)
+
+        return square_rect
+
 
-                    # Scale the piece image to the calculated size
-                    scaled_image = pygame.transform.scale(piece.image, (scaled_size, scaled_size))
 
-                    # Calculate the pixel coordinates (x, y) of the piece on the board
-                    x = col * SQUARE_SIZE + (SQUARE_SIZE - scaled_size) // 2
-                    y = TOP_BAR_HEIGHT + row * SQUARE_SIZE + (SQUARE_SIZE - scaled_size) // 2
+    def selected_destinations(self):
+        """
+        Returns the legal destinations of the selected piece (see legal_destinations), or an empty dict if nothing is selected.
+        """
+        if self.selected_piece_pos is None:
+            return {}
+        return self.legal_destinations(*self.selected_piece_pos)
 
-                    # Blit (draw) the scaled piece image on the board surface
-                    surface.blit(scaled_image, (x, y))
 
+    def legal_destinations(self, row, col):
+        """
+        Returns {(row, col): capture} of the squares the piece at (row, col) can legally move to (quiet moves, captures,
+        castling and en passant), read from the legal move map cached for the position.
+        """
+        start_code = self.squares[square_index(row, col)]
+        destinations = {}
+        for (end_row, end_col), move in self.legal_move_map().get((row, col), {}).items():
+            # The king and rook squares that also select castling are not where the piece goes
+            if (end_row, end_col) != (move[2], move[3]):
+                continue
+
+            # A pawn moving diagonally to an empty square captures en passant
+            destinations[(end_row, end_col)] = (
+                self.squares[square_index(end_row, end_col)] != EMPTY
+                or start_code & PIECE_TYPE_MASK == PAWN and end_col != col
+            )
+        return destinations
 
 
     def set_piece(self, row, col, piece):
@@ -65,6 +147,7 @@ class Chessboard:
         Places piece at specified row, col on the 
         """
         self.board[row][col] = piece
+        self.dirty_squares.add((row, col))
 
 
     def get_piece(self, row, col):
@@ -79,56 +162,56 @@ class Chessboard:
         Clears piece at specified row, col on the chessboard
         """
         self.board[row][col] = None
+        self.dirty_squares.add((row, col))
 
 
     def initialize_board(self):
         """
         Initiisalses starting board, sets pieces and resets all game variables 
         """
+        self.set_fen(STARTING_FEN)
+
+
+    def set_fen(self, fen):
+        """
+        Sets up the game from a FEN (Forsyth-Edwards Notation) string and resets all game variables.
+        """
+        super().set_fen(fen)
+        self.reset_view()
 
-        # Reset all variables to the starting value for a new game
-        self.current_player = 'w'  # 'w' for white, 'b' for black
+
+    def reset_view(self):
+        """
+        Resets the game variables and the board view to match a newly set up position.
+        """
         self.selected_piece = None
         self.selected_piece_pos = None
-        self.white_pieces = ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R', 'P', 'P', 'P', 'P', 'P', 'P', 'P', 'P']
-        self.black_pieces = ['p', 'p', 'p', 'p', 'p', 'p', 'p', 'p', 'r', 'n', 'b', 'q', 'k', 'b', 'n', 'r']
         self.white_captured_pieces = []
         self.black_captured_pieces = []
-        self.moves_since_last_pawn_move = 0
-        self.moves_since_last_capture = 0
-        self.last_boards = []
         self.moves = []
         self.uci_moves = []
-        self.current_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 0"
 
-        # Loop through each cell of the chessboard
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                # Get the letter representing the piece at the current cell from the STARTING_BOARD configuration
-                piece_letter = STARTING_BOARD[row][col]
-                
-                # Check if the cell contains a piece (not an empty space)
-                if piece_letter != ' ':
-                    # Check if the piece has a valid mapping in the PIECE_MAPPING dictionary
-                    if piece_letter in PIECE_MAPPING:
-                        # Get the filename for the piece's image from the PIECE_MAPPING
-                        filename = PIECE_MAPPING[piece_letter]
-                        
-                        # Load the image of the piece from the assets directory
-                        image_path = os.path.join("assets", filename)
-                        image = pygame.image.load(image_path)
-                        
-                        # Determine the color of the piece based on whether the piece_letter is uppercase (white) or lowercase (black)
-                        color = 'w' if piece_letter.isupper() else 'b'
-                        
-                        # Create a new Piece object with the loaded image and color, and set it at the current cell on the board
-                        self.set_piece(row, col, Piece(piece_letter, image, color))
-                    else:
-                        # If the piece_letter is not found in the PIECE_MAPPING, raise a ValueError with an appropriate message
-                        raise ValueError(f"No image mapping found for piece '{piece_letter}'")
-                else:
-                    # If the cell is empty, clear the piece at the current cell on the board
-                    self.clear_piece(row, col)
+        self.update_board_view()
+        self.white_pieces = [CODE_NOTATIONS[code] for code in self.squares if code and not code & BLACK]
+        self.black_pieces = [CODE_NOTATIONS[code] for code in self.squares if code & BLACK]
+        self.current_fen = self.to_fen()
+
+
+    def update_board_view(self):
+        """
+        Updates the board grid of Piece objects drawn on screen to match the rule engine's position.
+        Only the squares whose piece changed are replaced, which marks them to be redrawn.
+        """
+        squares = self.squares
+        for row, board_row in enumerate(self.board):
+            for col, piece in enumerate(board_row):
+                code = squares[row * CHESSBOARD_SIZE + col]
+                if (piece.code if piece else EMPTY) == code:
+                    continue
+
+                # Same as set_piece / clear_piece, inlined as this runs over every square of every new position
+                board_row[col] = PIECES[code]
+                self.dirty_squares.add((row, col))
 
 
 
@@ -174,14 +257,6 @@ class Chessboard:
 
 
 
-    def coord_to_square_notation(self, coord):
-        """
-        Converts coordinates (x, y) to chess square notation (e.g., 'a1', 'b2').
-        """
-        x, y = coord
-        return COLUMN_LETTERS[y] + str(8 - x)
-
-
     def move_to_uci(self, selected_row, selected_col, row, col, piece):
         """
         Converts a move to UCI notation (Universal Chess Interface) including promotion notation if applicable.
@@ -191,113 +266,16 @@ class Chessboard:
         promote_chosen = ''
 
         # Check if the piece is a pawn and if the move is a promotion move (reaching the last rank)
-        if piece.notation.lower() == 'p':
+        if piece.code & PIECE_TYPE_MASK == PAWN:
             if row == 0 or row == 7:
                 # Get the piece at the destination position (promotion piece)
                 promotion_piece = self.board[row][col]
-                promote_chosen = promotion_piece.notation.upper()
+                promote_chosen = promotion_piece.notation.lower()  # UCI always writes the promotion piece in lowercase
 
         # Concatenate the starting position, destination position, and promotion notation (if any)
         return starting_pos + dest_pos + promote_chosen
 
 
-    def square_notation_to_coord(self, square_notation):
-        """
-        Converts chess square notation (e.g., 'a1', 'b2') to coordinates (x, y).
-        """
-        x = COLUMN_LETTERS.index(square_notation[0])
-        y = 8 - int(square_notation[1])
-        return y, x
-
-
-    def uci_to_move(self, uci_move):
-        """
-        Converts a move in UCI notation (e.g., 'e2e4', 'e7e8q') to coordinates (x, y) for the source and destination squares.
-        """
-        # Extract source (selected) row and column from the first two characters of the UCI move
-        selected_row, selected_col = self.square_notation_to_coord(uci_move[0:2])
-
-        # Extract destination row and column from the last two characters of the UCI move
-        row, col = self.square_notation_to_coord(uci_move[2:4])
-
-        return selected_row, selected_col, row, col
-
-
-    def board_to_fen(self, board):
-        """
-        Converts the current board state to the Forsyth-Edwards Notation (FEN) string.
-        """
-
-        fen = ""
-        empty_squares = 0
-
-        # Step 1: Convert the board state to the piece placement section using list comprehensions
-        for row in board:
-            for square in row:
-                if square is None:
-                    empty_squares += 1
-                else:
-                    if empty_squares > 0:
-                        fen += str(empty_squares)
-                        empty_squares = 0
-                    fen += square.notation
-
-            if empty_squares > 0:
-                fen += str(empty_squares)
-                empty_squares = 0
-
-            fen += "/"
-
-        fen = fen[:-1]  # Remove the trailing '/' character
-
-        # Step 2: Determine the active color and add it to the FEN string
-        fen += ' '
-        fen += self.current_player
-
-        # Step 3: Determine the castling availability, FEN only checks if kings / rooks have moved
-
-        castle_options = ' '
-
-        w_k = self.get_piece(7,4)
-        w_h_r = self.get_piece(7,7)
-        w_a_r = self.get_piece(7,0)
-
-        b_k = self.get_piece(0,4)
-        b_h_r = self.get_piece(0,7)
-        b_a_r = self.get_piece (0,0)
-
-        if w_k and w_k.notation == 'K' and w_k.has_moved == False:
-            if  w_h_r and w_h_r.notation == 'R'and  w_h_r.has_moved == False:
-                castle_options += 'K' # White Kingside
-            else:
-                castle_options += '-'
-            if w_a_r and w_a_r.notation == 'R'and  w_a_r.has_moved == False:
-                castle_options += 'Q' # White Queenside
-            else:
-                castle_options += '-'
-
-        if b_k and b_k.notation == 'k' and b_k.has_moved == False:
-            if  b_h_r and b_h_r.notation == 'r'and  b_h_r.has_moved == False:
-                castle_options += 'k' # Black kingside
-            else:
-                castle_options += '-'
-            if b_a_r and b_a_r.notation == 'r'and  b_a_r.has_moved == False:
-                castle_options += 'q' # Black queenside
-            else:
-                castle_options += '-'
-
-        fen += castle_options + ' '
-
-        # Step 4: Determine the en passant target square (for this example, assuming no en passant)
-        en_passant_square = self.find_en_passant_square()
-        fen += (self.coord_to_square_notation(en_passant_square) if en_passant_square else '-')
-
-        # Step 5: Add the halfmove clock and fullmove number (assuming both are 0)
-        fen += f' {min(self.moves_since_last_capture, self.moves_since_last_pawn_move)} {math.floor(len(self.moves) // 2)}'
-
-        return fen
-    
-
     def show_promotion_dialog(self, surface, row, col, color):
         """
         Shows a promotion dialog box to the player after a pawn reaches the opposite end of the board.
@@ -311,7 +289,7 @@ class Chessboard:
         else:
             raise ValueError(f"Invalid pawn color: {color}")
 
-        option_images = [pygame.image.load(os.path.join("assets", PIECE_MAPPING[option])) for option in promotion_options]
+        option_images = [SPRITES.sprite(option, SQUARE_SIZE) for option in promotion_options]
         option_rects = []
 
         # Calculate the dimensions and position of the promotion dialog box
@@ -328,11 +306,12 @@ class Chessboard:
         for i, image in enumerate(option_images):
             x = dialog_x + i * (SQUARE_SIZE + 20)
             y = dialog_y + 10
-            scaled_image = pygame.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE))
-            surface.blit(scaled_image, (x, y))
+            surface.blit(image, (x, y))
             option_rect = pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE)
             option_rects.append(option_rect)
 
+        # The dialog waits for the player's choice in its own event loop, so no frame is rendered until it closes
+        # and it has to show itself; the board squares under it are redrawn by the render scheduler afterwards
         pygame.display.flip()
 
         # Wait for the player to make a selection
@@ -349,719 +328,166 @@ class Chessboard:
 
                         
 
-    def promote_pawn(self, row, col):
-        """
-        Promotes a pawn on the chessboard if it reaches the last rank.
-        """
-        # Get the piece at the specified position on the chessboard
-        piece = self.get_piece(row, col)
-
-        # Check if the piece exists and if it is a pawn (notation is 'p' or 'P')
-        if piece and piece.notation.lower() == 'p':
-            # Check if the pawn is at the last rank (for both black and white)
-            if (piece.color == 'b' and row == 7) or (piece.color == 'w' and row == 0):
-                # Show the promotion dialog and get the player's choice
-                new_piece_notation = self.show_promotion_dialog(self.window, row, col, piece.color)
-
-                # Create the new promoted piece with the chosen notation and update the board
-                promoted_piece = Piece(new_piece_notation, pygame.image.load(os.path.join("assets", PIECE_MAPPING[new_piece_notation])), piece.color)
-                self.set_piece(row, col, promoted_piece)
-
-                
-
-    def update_counters(self, piece, selected_row, selected_col, row, col, destination_piece):
+    def update_counters(self, piece, selected_row, selected_col, row, col, captured_notation):
         """
         Updates various counters and lists after a move is made.
         """
         # Append the move coordinates to the moves list
         self.moves.append((selected_row, selected_col, row, col))
 
-        # Append the current board state along with the moves made to the last_boards list
-        self.last_boards.append((np.copy(self.board), self.moves))
-
-        # Check if the length of the last_boards list is more than 6, and if so, remove the oldest board state and moves
-        if len(self.last_boards) > 6:
-            self.last_boards.pop(0)
-
-        # Increment the moves_since_last_pawn_move counter if the piece is not a pawn; otherwise, reset it to 0
-        if piece.notation.lower() == 'p':
-            self.moves_since_last_pawn_move = 0
-        else:
-            self.moves_since_last_pawn_move += 1
-
         # Check if there is a piece at the destination position (captured piece)
-        if destination_piece is not None:
-            # Reset the moves_since_last_capture counter to 0
-            self.moves_since_last_capture = 0
-
+        if captured_notation is not None:
             # Check if the captured piece belongs to the opponent (white capturing black)
-            if destination_piece.color == 'b':
+            if captured_notation.islower():
                 try:
                     # Remove the captured piece's notation from the black_pieces list
-                    self.black_pieces.remove(destination_piece.notation)
+                    self.black_pieces.remove(captured_notation)
                     # Append the captured piece's notation to the white_captured_pieces list
-                    self.white_captured_pieces.append(destination_piece.notation)
+                    self.white_captured_pieces.append(captured_notation)
                 except ValueError:
                     pass  # If the value is not found, do nothing
 
             # Check if the captured piece belongs to the opponent (black capturing white)
-            elif destination_piece.color == 'w':
+            else:
                 try:
                     # Remove the captured piece's notation from the white_pieces list
-                    self.white_pieces.remove(destination_piece.notation)
+                    self.white_pieces.remove(captured_notation)
                     # Append the captured piece's notation to the black_captured_pieces list
-                    self.black_captured_pieces.append(destination_piece.notation)
+                    self.black_captured_pieces.append(captured_notation)
                 except ValueError:
                     pass  # If the value is not found, do nothing
-        else:
-            # If no piece is captured, increment the moves_since_last_capture counter
-            self.moves_since_last_capture += 1
-
-
-    def check_for_outcome(self):
-        """
-        Checks for different game outcomes and prints the corresponding messages.
-        """
-        # Determine the opponent's color based on the current player's color
-        opponent_color = 'w' if self.current_player == 'b' else 'b'
-
-        # Find the position of the opponent's king on the chessboard
-        opponent_king_position = self.find_king_position(opponent_color)
-
-        # Check if the opponent's king is on the board and is in check
-        if opponent_king_position is not None and self.check_for_check(opponent_king_position, opponent_color):
-            # If the opponent's king is in check
-
-            # Check if the opponent's king is in checkmate
-            if self.check_for_checkmate(opponent_king_position, opponent_color):
-                print('Checkmate! Game Over')
-            else:
-                print("Opponent's king is in check!")
-        # Check for other draw conditions
-        elif self.check_for_stalemate(opponent_king_position, opponent_color):
-            print('Draw - Stalemate')
-        elif self.check_for_insufficient_material():
-            print('Draw - Insufficient Material')
-        elif self.check_for_fifty_moves():
-            print('Draw - Fifty Move Rule')
-        elif self.check_for_threefold_repetition():
-            print('Draw - Threefold Repetition')
 
 
     def move_piece(self, row, col):
         """
-        Moves the selected piece to the specified row and column, if the move is valid.
-        """
-        # Get the row and column of the selected piece
-        selected_row, selected_col = self.selected_piece_pos
-
-        # Get the selected piece from the board
-        piece = self.selected_piece
-
-        # Get the piece (if any) at the destination position
-        destination_piece = self.board[row][col]
-
-        # Check if the selected piece is not None and the move is valid, or if it is a valid castling move, or if it is a valid en passant move
-        if piece and (
-            self.is_valid_move(selected_row, selected_col, row, col)
-            or self.is_valid_castling_move(selected_row, selected_col, row, col)
-            or self.is_valid_en_passant(selected_row, selected_col, row, col, piece)
-        ):
-            # If the move is a standard valid move
-            if self.is_valid_move(selected_row, selected_col, row, col):
-                # Perform the valid move
-                self.perform_valid_move(selected_row, selected_col, row, col, piece)
-
-            # If the move is a valid castling move
-            if self.is_valid_castling_move(selected_row, selected_col, row, col):
-                # Perform the castling move
-                self.perform_castling(selected_row, selected_col, row, col, piece)
-                # Update the destination piece to None since the rook moves as part of castling
-                destination_piece = None
-
-            # If the move is a valid en passant move
-            if self.is_valid_en_passant(selected_row, selected_col, row, col, piece):
-                # Perform the en passant move
-                self.perform_en_passant(selected_row, selected_col, row, col, piece)
-
-            # Update various counters and check for game outcomes
-            self.update_counters(piece, selected_row, selected_col, row, col, destination_piece)
-            self.check_for_outcome()
-
-            # Switch to the next player's turn
-            self.toggle_player_turn()
-
-            # Convert the move to UCI notation and add it to the list of UCI moves
-            uci_notation = self.move_to_uci(selected_row, selected_col, row, col, piece)
-            self.uci_moves.append(uci_notation)
-
-            # Convert the current board state to the FEN (Forsyth-Edwards Notation) format
-            self.current_fen = self.board_to_fen(self.board)
-
-        
-
-            
-
-
-   
-    def check_for_check(self, king_position, king_color, board=None):
-        """
-        Checks if the king of the specified color is under attack by any of the opponent's pieces.
-        """
-        # If a board is not provided, use the current board of the game
-        if board is None:
-            board = self.board
-
-        # Extract the row and column of the king's position
-        king_row, king_col = king_position
-
-        # Loop through each cell of the chessboard
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                # Get the piece at the current cell
-                piece = board[row][col]
-
-                # Check if there is a piece at the current cell and it is of the opponent's color (not king_color)
-                if piece and piece.color != king_color:
-                    # Check if the piece at (row, col) can attack the king at (king_row, king_col)
-                    if self.is_valid_move(row, col, king_row, king_col, board=board):
-                        # If the opponent's piece can attack the king, return True (check)
-                        return True
-
-        # If no opponent's piece can attack the king, return False (no check)
-        return False
-
-    
-
-    def check_for_checkmate(self, king_position, king_color, board=None):
-        """
-        Checks if the king of the specified color is in checkmate (cannot escape from check).
-        """
-        # If a board is not provided, use the current board of the game
-        if board is None:
-            board = self.board
-
-        # Check if any move by the opponent's pieces can move the king out of check
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                # Get the piece at the current cell
-                piece = board[row][col]
-
-                # Check if there is a piece at the current cell and it is of the king's color (king_color)
-                if piece and piece.color == king_color:
-                    # Loop through all possible moves for the king's piece
-                    for move_row in range(CHESSBOARD_SIZE):
-                        for move_col in range(CHESSBOARD_SIZE):
-                            # Check if the move (row, col) -> (move_row, move_col) is a valid move
-                            if self.is_valid_move(row, col, move_row, move_col, board=board):
-                                # Simulate the move by creating a temporary copy of the board
-                                temp_board = np.copy(board)
-                                temp_board[move_row][move_col] = piece
-                                temp_board[row][col] = None
-
-                                # Check if the move moves the king out of check (check_for_check returns False)
-                                if not self.check_for_check(king_position, king_color, board=temp_board):
-                                    return False  # King can move out of check, not checkmate
-
-        # If no move can move the king out of check, return True (checkmate)
-        return True
-
-
-    def check_for_stalemate(self, opponent_king_position, opponent_color, board=None):
-        """
-        Checks if the player with the specified opponent color is in stalemate (no legal moves).
-        """
-        # If a board is not provided, use the current board of the game
-        if board is None:
-            board = self.board
-
-        # Loop through each cell of the chessboard
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                # Get the piece at the current cell
-                piece = board[row][col]
-
-                # Check if there is a piece at the current cell and it is of the opponent's color (opponent_color)
-                if piece and piece.color == opponent_color:
-                    # Loop through all possible moves for the opponent's piece
-                    for move_row in range(CHESSBOARD_SIZE):
-                        for move_col in range(CHESSBOARD_SIZE):
-                            # Check if the move (row, col) -> (move_row, move_col) is a valid move
-                            if self.is_valid_move(row, col, move_row, move_col, board=board):
-                                # Simulate the move by creating a temporary copy of the board
-                                temp_board = np.copy(board)
-                                temp_board[move_row][move_col] = piece
-                                temp_board[row][col] = None
-
-                                # Check if the move results in a position where the opponent's king is not in check
-                                if opponent_king_position is not None and not self.check_for_check(opponent_king_position, opponent_color, board=temp_board):
-                                    return False  # Player has at least one legal move
-
-        # If no move can be made by the player without putting their own king in check, return True (stalemate)
-        return True
-
-    
-
-    def check_for_insufficient_material(self, board=None):
-        """
-        Checks if there is insufficient material for either side to checkmate the opponent.
-        """
-        # If a board is not provided, use the current board of the game
-        if board is None:
-            board = self.board
-
-        # Check for insufficient material
-        if (
-            len(self.white_pieces) <= 2 and all(piece in ['K', 'B', 'N'] for piece in self.white_pieces) and
-            len(self.black_pieces) <= 2 and all(piece in ['k', 'b', 'n'] for piece in self.black_pieces)
-        ):
-            return True  # Insufficient material
-
-        return False  # Sufficient material
-
-    
-
-    def check_for_fifty_moves(self, board=None):
-        """
-        Checks if there have been 50 consecutive moves without any pawn move or capture.
+        Moves the selected piece to the specified row and column, if the move is legal.
         """
-        # If a board is not provided, use the current board of the game
-        if board is None:
-            board = self.board
+        # Look the clicked squares up in the legal moves of the position, which also holds the king and rook clicks of castling
+        move = self.legal_move_map().get(self.selected_piece_pos, {}).get((row, col))
+        if self.selected_piece is None or move is None:
+            return
 
-        # Check if there have been 50 or more consecutive moves without any pawn move or capture
-        if self.moves_since_last_capture >= 50 or self.moves_since_last_pawn_move >= 50:
-            return True  # Fifty moves rule is satisfied (draw)
+        start_row, start_col, end_row, end_col, promotion = move
 
-        return False  # Fifty moves rule is not satisfied
+        # Ask the player which piece to promote to if a pawn reaches the last rank
+        if promotion is not None:
+            promotion = self.show_promotion_dialog(self.window, end_row, end_col, self.selected_piece.color)
 
-    
+            # The dialog was drawn over the board, so every square needs to be drawn again
+            self.dirty_squares.update((r, c) for r in range(CHESSBOARD_SIZE) for c in range(CHESSBOARD_SIZE))
+            move = (start_row, start_col, end_row, end_col, promotion)
 
-    def check_for_threefold_repetition(self):
-        """
-        Checks if the current board state has occurred three or more times in the game history (last_boards).
-        """
-        current_board = np.copy(self.board)
+        self.apply_move(move)
 
-        # Count how many times the current board state appears in the last_boards list
-        count = sum(1 for board, _ in self.last_boards if np.array_equal(board, current_board))
 
-        # If the count is 3 or more, it's a threefold repetition
-        return count >= 3
-
-    
-    def move_exposes_own_king_to_check(self, start_row, start_col, end_row, end_col, board=None):
+    def apply_move(self, move):
         """
-        Checks if a move from the start position to the end position exposes the player's king to check.
+        Plays a legal (start_row, start_col, end_row, end_col, promotion) move in the game, from a click or from the computer,
+        updating the board view, the move lists, the captured pieces and the FEN.
+        Returns the Outcome of the new position (check, checkmate or a draw), for the GUI to show.
         """
-        if board is None:
-            board = self.board
+        selected_row, selected_col, row, col, promotion = move
+        piece = self.get_piece(selected_row, selected_col)
 
-        # Create a temporary board to simulate the move
-        temp_board = np.copy(board)
-        piece = temp_board[start_row][start_col]
-        temp_board[start_row][start_col] = None
-        temp_board[end_row][end_col] = piece
+        # Perform the move in the rule engine and redraw its pieces
+        undo_info = self.play_move(move)
+        self.update_board_view()
 
-        # Find the player's king position after the move
-        player_king_color = piece.color
-        player_king_position = self.find_king_position(player_king_color, board=temp_board)
+        # Update various counters (the captured piece includes pawns taken en passant)
+        self.update_counters(piece, selected_row, selected_col, row, col, undo_info[1])
 
-        # Check if the player's king is in check after the move
-        if player_king_position is not None:
-            return self.check_for_check(player_king_position, player_king_color, board=temp_board)
+        # Convert the move to UCI notation and add it to the list of UCI moves
+        uci_notation = self.move_to_uci(selected_row, selected_col, row, col, piece)
+        self.uci_moves.append(uci_notation)
 
-        return False
+        # Convert the current board state to the FEN (Forsyth-Edwards Notation) format
+        self.current_fen = self.to_fen()
 
+        # The outcome is cached for the position, so the GUI and the legal move map read the same result later
+        return self.check_for_outcome()
 
 
-    def find_king_position(self, color, board=None):
+    def undo_last_move(self):
         """
-        Finds the position of the king of the specified color on the chessboard.
+        Takes back the last move played in the game, including the move lists and captured pieces.
         """
-        if board is None:
-            board = self.board
+        taken_back = self.take_back_move()
+        if taken_back is None:
+            return
 
-        # Iterate through the chessboard to find the king of the specified color
-        for row in range(CHESSBOARD_SIZE):
-            for col in range(CHESSBOARD_SIZE):
-                piece = board[row][col]
-                if piece and piece.notation.lower() == 'k' and piece.color == color:
-                    return row, col
+        move, undo_info = taken_back
+        self.update_board_view()
 
-        # If the king of the specified color is not found, return None
-        return None
+        self.moves.pop()
+        self.uci_moves.pop()
 
-    
+        # Return the captured piece (if any) to its side's list of pieces
+        captured_notation = undo_info[1]
+        if captured_notation is not None:
+            if captured_notation.islower() and self.white_captured_pieces:
+                self.white_captured_pieces.pop()
+                self.black_pieces.append(captured_notation)
+            elif captured_notation.isupper() and self.black_captured_pieces:
+                self.black_captured_pieces.pop()
+                self.white_pieces.append(captured_notation)
 
-    def is_valid_castling_move(self, start_row, start_col, end_row, end_col, board=None):
-        """
-        Checks if the move is a valid castling move (king-side or queen-side) on the chessboard.
-        """
-        if board is None:
-            board = self.board
-
-        # Retrieve the start and end pieces from the board
-        start_piece = board[start_row][start_col]
-        end_piece = board[end_row][end_col]
-
-        # Check if the start or end positions are empty or do not contain a king or rook
-        if start_piece is None or end_piece is None:
-            return False
-
-        if start_piece.notation.lower() not in ['k', 'r'] or end_piece.notation.lower() not in ['k', 'r']:
-            return False
-
-        # Check if the king or rook has moved before (castling requires unmoved king and rook)
-        if start_piece.has_moved or end_piece.has_moved:
-            return False
-
-        # Check if there are no pieces between the king and the rook
-        step = 1 if start_col < end_col else -1
-        rook_col = end_col - step
-        while rook_col != start_col:
-            if board[start_row][rook_col]:
-                return False
-            rook_col -= step
-
-        # Check if the king passes through or ends up in an attacked square
-        opponent_color = 'b' if start_piece.color == 'w' else 'w'
-        for col in range(min(start_col, end_col), max(start_col, end_col) + 1):
-            if self.check_for_check((start_row, col), start_piece.color, board=board):
-                return False
-
-        # If all conditions are met, the move is a valid castling move
-        return True
-
-
-
-    def perform_castling(self, start_row, start_col, end_row, end_col, selected_piece):
-        """
-        Performs castling move on the chessboard.
-        """
-        # Determine the direction of castling (left or right)
-        direction = 1 if start_col < end_col else -1
-
-        # If the selected piece is a rook, the direction is flipped
-        if selected_piece.notation.lower() == 'r':
-            direction = -direction
-
-        # Perform king-side castling 
-        if direction == 1:
-            rook_col = 7
-            king_col = 4
-            new_rook_col = 5
-            new_king_col = 6
-        # Perform queen-side castling
-        else:
-            rook_col = 0
-            king_col = 4
-            new_rook_col = 3
-            new_king_col = 2
-
-        # Move the king to the new position
-        king_piece = self.get_piece(start_row, king_col)
-        self.set_piece(start_row, king_col, None)
-        self.set_piece(start_row, new_king_col, king_piece)
-        king_piece.has_moved = True
-
-        # Move the rook to the new position
-        rook_piece = self.get_piece(start_row, rook_col)
-        self.set_piece(start_row, rook_col, None)
-        self.set_piece(start_row, new_rook_col, rook_piece)
-        rook_piece.has_moved = True
-
-
-    def find_en_passant_square(self):
-        """
-        Finds the en passant square on the chessboard.
-        """
-        if self.last_boards:
-            # Get the previous board and move from the last_boards list
-            prev_board = self.last_boards[-1][0]
-            prev_move = self.last_boards[-1][1][-1]
-            prev_start_row, prev_start_col = prev_move[0], prev_move[1]
-            prev_end_row, prev_end_col = prev_move[2], prev_move[3]
-            prev_piece = prev_board[prev_end_row][prev_end_col]
-
-            # Check if the previous move was performed by a pawn of the opposite color
-            if prev_piece and prev_piece.notation.lower() == 'p' and prev_piece.color != self.current_player:
-                # Check if the pawn moved two squares forward
-                if abs(prev_start_row - prev_end_row) == 2:
-                    # Return the en passant square based on the direction of the pawn
-                    if prev_piece.color == 'w':
-                        return prev_end_row + 1, prev_end_col
-                    else:
-                        return prev_end_row - 1, prev_end_col
-
-        return None  # No en passant square found
-
-
-    def is_valid_en_passant(self, selected_row, selected_col, row, col, piece):
-        """
-        Checks if the move is a valid en passant capture.
-        """
-        if self.last_boards:
-            # Get the previous board and move from the last_boards list
-            prev_board = self.last_boards[-1][0]
-            prev_move = self.last_boards[-1][1][-1]
-            prev_start_row, prev_start_col = prev_move[0], prev_move[1]
-            prev_end_row, prev_end_col = prev_move[2], prev_move[3]
-            prev_piece = prev_board[prev_end_row][prev_end_col]
-
-            # Check if the previous move was performed by a pawn of the opposite color
-            if prev_piece and prev_piece.notation.lower() == 'p' and prev_piece.color != piece.color:
-                # Check if the pawn moved two squares forward and landed on the same column as the current move
-                if abs(prev_start_row - prev_end_row) == 2 and prev_end_col == col:
-                    # Check if the current move is made by a pawn from the 3rd (for white) or 4th (for black) row
-                    if (selected_row == 3 and piece.color == 'w') or (selected_row == 4 and piece.color == 'b'):
-                        return True
-
-        return False
-
-    
-    def perform_en_passant(self, selected_row, selected_col, row, col, piece):
-        """
-        Performs the en passant capture and updates the board accordingly.
-        """
-        # Get the last move from the last_boards list
-        prev_move = self.last_boards[-1][1][-1]
-        prev_end_row, prev_end_col = prev_move[2], prev_move[3]
-
-        # Set the current piece to the new position (capturing the en passant pawn)
-        self.set_piece(row, col, piece)
-
-        # Remove the original pawn that was captured (en passant)
-        self.set_piece(selected_row, selected_col, None)
-
-        # Remove the captured pawn (located at the ending position of the previous move)
-        self.set_piece(prev_end_row, prev_end_col, None)
-
-        # Set the has_moved attribute of the capturing pawn to True
-        piece.has_moved = True
-
-
-    def is_valid_move(self, start_row, start_col, end_row, end_col, board=None):
-        """
-        Determines if the move from the starting position (start_row, start_col)
-        to the ending position (end_row, end_col) is valid.
-        """
-        if board is None:
-            board = self.board
-
-        piece = board[start_row][start_col]
-        destination_piece = board[end_row][end_col]  # Get the piece at the destination square
-
-        if destination_piece is None or destination_piece.color != piece.color:
-            # Destination square is either empty or occupied by an opponent's piece
-            # Continue with the existing move validation
-
-            if piece.notation.lower() == 'p':
-                return (
-                    self.is_valid_pawn_move(start_row, start_col, end_row, end_col, piece.color, board=board) and
-                    not self.move_exposes_own_king_to_check(start_row, start_col, end_row, end_col, board=board)
-                )
-            elif piece.notation.lower() == 'r':
-                return (
-                    self.is_valid_rook_move(start_row, start_col, end_row, end_col, board=board) and
-                    not self.move_exposes_own_king_to_check(start_row, start_col, end_row, end_col, board=board)
-                )
-            elif piece.notation.lower() == 'n':
-                return self.is_valid_knight_move(start_row, start_col, end_row, end_col)
-            elif piece.notation.lower() == 'b':
-                return (
-                    self.is_valid_bishop_move(start_row, start_col, end_row, end_col, board=board) and
-                    not self.move_exposes_own_king_to_check(start_row, start_col, end_row, end_col, board=board)
-                )
-            elif piece.notation.lower() == 'q':
-                return (
-                    self.is_valid_queen_move(start_row, start_col, end_row, end_col, board=board) and
-                    not self.move_exposes_own_king_to_check(start_row, start_col, end_row, end_col, board=board)
-                )
-            elif piece.notation.lower() == 'k':
-                return (
-                    self.is_valid_king_move(start_row, start_col, end_row, end_col) and
-                    not self.move_exposes_own_king_to_check(start_row, start_col, end_row, end_col, board=board)
-                )
-            else:
-                return False
-
-        return False
-
-    
-    def perform_valid_move(self, selected_row, selected_col, row, col, piece):
-        """
-        Performs a valid move from the starting position (selected_row, selected_col)
-        to the ending position (row, col) for the given piece.
-        """
-        self.set_piece(row, col, piece)  # Place the piece at the new position
-        self.promote_pawn(row, col)      # Check for pawn promotion
-        self.set_piece(selected_row, selected_col, None)  # Remove the piece from the old position
-        piece.has_moved = True           # Mark the piece as moved
-
-
-    def is_valid_pawn_move(self, start_row, start_col, end_row, end_col, color, board=None):
-        """
-        Checks if the pawn move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid for the given color (white or black).
-        """
-        if board is None:
-            board = self.board
-
-        direction = 1 if color == 'b' else -1
-
-        if start_col == end_col:
-            # Pawn moves forward
-            if start_row + direction == end_row and board[end_row][end_col] is None:
-                return True
-            
-            # Pawn double move on the first move
-            if (
-                (start_row == 1 and color == 'b' and end_row == 3) or
-                (start_row == 6 and color == 'w' and end_row == 4)
-            ):
-                if (
-                    board[start_row + direction][end_col] is None and
-                    board[end_row][end_col] is None
-                ):
-                    return True
-        else:
-            # Pawn captures diagonally
-            if start_row + direction == end_row and abs(start_col - end_col) == 1:
-                target_piece = board[end_row][end_col]
-                if target_piece:
-                    # Normal capture
-                    if target_piece.color != color:
-                        return True
-                else:
-                    # En passant capture dealt with in check_for_en_passant method
-                    pass
-        
-        return False
-
-
-    def is_valid_rook_move(self, start_row, start_col, end_row, end_col, board=None):
-        """
-        Checks if the rook move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid.
-        """
-        if board is None:
-            board = self.board
-
-        if start_row == end_row:
-            # Horizontal movement
-            step = 1 if start_col < end_col else -1
-            for col in range(start_col + step, end_col, step):
-                if board[start_row][col]:
-                    return False
-            return True
-        elif start_col == end_col:
-            # Vertical movement
-            step = 1 if start_row < end_row else -1
-            for row in range(start_row + step, end_row, step):
-                if board[row][start_col]:
-                    return False
-            return True
-        
-        return False
-
-
-    def is_valid_knight_move(self, start_row, start_col, end_row, end_col, board=None):
-        """
-        Checks if the knight move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid.
-        """
-        if board is None:
-            board = self.board
-
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
-
-        return (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2)
-
-
-    def is_valid_bishop_move(self, start_row, start_col, end_row, end_col, board=None):
-        """
-        Checks if the bishop move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid.
-        """
-        if board is None:
-            board = self.board
-
-        if abs(start_row - end_row) == abs(start_col - end_col):
-            # Diagonal movement
-            row_step = 1 if start_row < end_row else -1
-            col_step = 1 if start_col < end_col else -1
-            row = start_row + row_step
-            col = start_col + col_step
-
-            while row != end_row:
-                if board[row][col]:
-                    return False
-                row += row_step
-                col += col_step
-
-            return True
+        self.selected_piece = None
+        self.selected_piece_pos = None
+        self.current_fen = self.to_fen()
 
-        return False
 
-    def is_valid_queen_move(self, start_row, start_col, end_row, end_col, board=None):
+    def load_game(self, uci_moves, start_fen=STARTING_FEN):
         """
-        Checks if the queen move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid.
+        Sets up the game from its starting position and plays the UCI moves, raising ValueError at an illegal move.
         """
-        if board is None:
-            board = self.board
-
-        return (
-            self.is_valid_rook_move(start_row, start_col, end_row, end_col, board=board) or
-            self.is_valid_bishop_move(start_row, start_col, end_row, end_col, board=board)
-        )
+        self.set_fen(start_fen)
+        for uci_move in uci_moves:
+            move = self.uci_to_move(uci_move)
+            if move not in self.current_legal_moves():
+                raise ValueError(f"Illegal move '{uci_move}'")
+            self.apply_move(move)
 
 
-    def is_valid_king_move(self, start_row, start_col, end_row, end_col, board=None):
+    def load_pgn(self, path, game_index=0):
         """
-        Checks if the king move from the starting position (start_row, start_col) to
-        the ending position (end_row, end_col) is valid.
+        Loads a game (the first one by default) from a PGN file.
         """
-        if board is None:
-            board = self.board
+        with open(path, encoding='utf-8') as file:
+            for index, game in enumerate(read_games(file)):
+                if index == game_index:
+                    self.load_game(game.uci_moves(), game.start_fen)
+                    return game.headers
 
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
+        raise ValueError(f"'{path}' has no game {game_index + 1}")
 
-        return (row_diff == 1 and col_diff == 0) or (row_diff == 0 and col_diff == 1) or (row_diff == 1 and col_diff == 1)
 
-
-    def toggle_player_turn(self):
+    def save_pgn(self, path, headers=None):
         """
-        Toggles the current player's turn between 'w' (white) and 'b' (black).
+        Saves the game played so far to a PGN file.
         """
-        if self.current_player == 'w':
-            self.current_player = 'b'
-        else:
-            self.current_player = 'w'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(write_game(self.uci_moves, headers, self.start_fen))
 
 
     def reset_game(self):
         """
-        Resets the game to the starting position.
+        Resets the game to the starting position. The window is redrawn by the render scheduler on the next frame.
         """
         self.initialize_board()  # Initializes the board with the starting position
-        self.draw(self.window)  # Draws the chessboard and pieces on the window
-        pygame.display.flip()  # Updates the display to show the changes
 
 
 
 class Piece:
-    def __init__(self, notation, image, color):
+    # Only a view of a board square for drawing and clicks, the rules work on the piece codes of the position
+    __slots__ = ('notation', 'color', 'code')
+
+    def __init__(self, notation, color):
         """
-        Initializes a chess piece.
+        Initializes a chess piece. Its image is not stored on the piece, it is drawn from the shared sprite cache.
         """
         self.notation = notation  # The notation of the chess piece (e.g., 'K', 'Q', 'R', 'B', 'N', 'P')
-        self.image = image  # The image representing the chess piece
         self.color = color  # The color of the piece ('w' for white, 'b' for black)
-        self.has_moved = False  # A flag to track if the piece has moved during the game
+        self.code = PIECE_CODES[notation]  # The piece code stored for it in Position.squares
 
     def __repr__(self):
         """
@@ -1070,3 +496,5 @@ class Piece:
         return self.notation
 
 
+# Pieces hold no state of their own, so every square with the same piece shares one Piece object, indexed by piece code
+PIECES = [Piece(notation, 'w' if notation.isupper() else 'b') if notation else None for notation in CODE_NOTATIONS]
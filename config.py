@@ -1,5 +1,6 @@
 import os
-import numpy as np
+
+from bitboard import CHESSBOARD_SIZE
 
 # Define the window dimensions
 WINDOW_WIDTH = 550
@@ -12,26 +13,32 @@ TOP_BAR_HEIGHT = 75
 SIDE_BAR_WIDTH = 150
 
 # Define the chessboard dimensions
-CHESSBOARD_SIZE = 8
 SQUARE_SIZE = (WINDOW_WIDTH - SIDE_BAR_WIDTH) // CHESSBOARD_SIZE
 
 PIECE_SIZE_SCALE = 0.75
 
+# Translucent color of the markers showing where the selected piece can move (RGBA)
+MOVE_MARKER_COLOR = (40, 40, 40, 100)
+
 LINE_THICKNESS = 5
 
-STARTING_BOARD = np.array([
-    ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'],
-    ['p', 'p', 'p', 'p', 'p', 'p', 'p', 'p'],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
-    ['P', 'P', 'P', 'P', 'P', 'P', 'P', 'P'],
-    ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
-     ])
+# Maximum number of frames drawn per second
+FRAME_RATE = 60
+
+# Side played by the built-in engine ('w' or 'b'), or None for two human players
+COMPUTER_COLOR = None
+
+# Search limits of the built-in engine for each of its moves
+ENGINE_TIME_LIMIT = 1.0  # Seconds
+ENGINE_MAX_DEPTH = 64
+ENGINE_HASH_MB = 16  # Memory used by the engine's transposition table
 
+# Stockfish binary used for the evaluation bar and batch analysis (a list for a full command line, e.g. the fake engine)
+STOCKFISH_PATH = r"stockfish\stockfish-windows-x86-64-avx2.exe"  # Replace with path to locally stored stockfish directory
 
-COLUMN_LETTERS = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+# Stockfish evaluations are kept on disk, so positions seen in earlier games are evaluated instantly
+EVALUATION_CACHE_PATH = "evaluation_cache.sqlite3"
+EVALUATION_CACHE_SIZE = 200000  # Positions kept before the least recently used are removed
 
 
 def load_pieces_from_folder(folder_path):
@@ -0,0 +1,387 @@
+import time
+
+from position import *
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+
+# Piece values in centipawns
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# The same values indexed by piece type code, for move ordering on the piece codes of the board
+PIECE_TYPE_VALUES = [0] + [PIECE_VALUES[piece_type] for piece_type in 'PNBRQK']
+
+# Bonus in centipawns for a white piece on each square (row 0 is the 8th rank), black uses the mirrored square
+PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+QUEEN_TABLE = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+
+PIECE_TABLES = {'P': PAWN_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE, 'K': KING_TABLE}
+
+# Value plus square bonus of every piece on every square, from white's point of view (black pieces count negative)
+PIECE_SQUARE_VALUES = {}
+for notation in PIECE_NOTATIONS:
+    table = PIECE_TABLES[notation.upper()]
+    value = PIECE_VALUES[notation.upper()]
+    if notation.isupper():
+        PIECE_SQUARE_VALUES[notation] = [value + table[square] for square in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE)]
+    else:
+        # Flip the rows so that black's table is seen from black's side of the board
+        PIECE_SQUARE_VALUES[notation] = [-(value + table[square ^ 56]) for square in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE)]
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000  # Scores beyond this are mates, stored in the transposition table relative to the node
+INFINITY = 1000000
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time limit is reached or a stop is requested.
+    """
+
+
+class Engine:
+
+    def __init__(self, max_depth=64, time_limit=1.0, hash_size_mb=16):
+        """
+        Initializes the search engine with its default depth and time (in seconds) limits per move,
+        and the memory budget of its transposition table in megabytes.
+        """
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.transposition_table = TranspositionTable(hash_size_mb)  # Kept between searches, its size never changes
+        self.nodes = 0  # Nodes searched by the last search
+        self.killers = []  # Two quiet moves per ply that caused a beta cutoff
+        self.history = {}  # Cutoff counts of quiet moves keyed by (piece code, end square)
+        self.deadline = None
+        self.stop_requested = False
+
+
+    def stop(self):
+        """
+        Asks a search running in another thread to return its best move as soon as possible.
+        """
+        self.stop_requested = True
+
+
+    def evaluate(self, position):
+        """
+        Returns the static evaluation of the position in centipawns, from the point of view of the side to move.
+        """
+        score = 0
+        pieces = position.bitboards.pieces
+        for notation in PIECE_NOTATIONS:
+            values = PIECE_SQUARE_VALUES[notation]
+            for square in iterate_squares(pieces[notation]):
+                score += values[square]
+
+        return score if position.current_player == 'w' else -score
+
+
+    def search(self, position, max_depth=None, time_limit=None):
+        """
+        Searches the position with iterative deepening until the depth or time limit is reached.
+        Returns (best move, score in centipawns for the side to move, depth completed), the move is None if there is no legal move.
+        """
+        max_depth = self.max_depth if max_depth is None else max_depth
+        time_limit = self.time_limit if time_limit is None else time_limit
+
+        # Search a copy so that the game is never left half way through a move when the search is interrupted
+        position = position.copy()
+
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit else None
+        self.stop_requested = False
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(max_depth + 1)]
+        self.history = {}
+        self.transposition_table.new_search()
+
+        moves = position.generate_legal_moves(position.current_player)
+        if not moves:
+            return None, 0, 0
+
+        best_move, best_score, completed_depth = moves[0], 0, 0
+        for depth in range(1, max_depth + 1):
+            try:
+                move, score = self.search_root(position, moves, depth, best_move)
+            except SearchTimeout:
+                break
+
+            best_move, best_score, completed_depth = move, score, depth
+
+            # Stop early on a forced mate, or if the next depth is unlikely to finish in time
+            if abs(score) >= MATE_SCORE - max_depth:
+                break
+            if self.deadline is not None and time.perf_counter() - start_time > (self.deadline - start_time) / 2:
+                break
+
+        return best_move, best_score, completed_depth
+
+
+    def search_root(self, position, moves, depth, previous_best_move):
+        """
+        Searches every root move to the given depth, trying the best move of the previous iteration first.
+        """
+        ordered_moves = self.order_moves(position, moves, 0, previous_best_move)
+
+        alpha, beta = -INFINITY, INFINITY
+        best_move = ordered_moves[0]
+        for move in ordered_moves:
+            undo_info = position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move(move, undo_info)
+
+            if score > alpha:
+                alpha, best_move = score, move
+
+        self.transposition_table.store(position.position_hash, depth, alpha, EXACT, best_move)
+
+        return best_move, alpha
+
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        """
+        Returns the score of the position for the side to move, searched to the given depth with alpha-beta pruning.
+        """
+        self.check_limits()
+
+        # A position repeated in the game or along the search, or the fifty move rule, is scored as a draw
+        if position.position_counts.get(position.position_hash) or position.check_for_fifty_moves():
+            return 0
+
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+
+        # Reuse the result of an earlier search of the same position if it went at least as deep
+        original_alpha = alpha
+        entry = self.transposition_table.probe(position.position_hash)
+        hash_move = None
+        if entry is not None:
+            entry_depth, entry_score, bound, hash_move = entry
+            if entry_depth >= depth:
+                entry_score = self.score_from_table(entry_score, ply)
+                if bound == EXACT:
+                    return entry_score
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if alpha >= beta:
+                    return entry_score
+
+        color = position.current_player
+        moves = position.generate_legal_moves(color)
+
+        # Checkmate (sooner mates score higher) or stalemate
+        if not moves:
+            return -MATE_SCORE + ply if self.in_check(position, color) else 0
+
+        # Mark the position as visited while its moves are searched, to detect repetitions along the search
+        position.position_counts[position.position_hash] = 1
+
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(position, moves, ply, hash_move):
+            piece = position.squares[square_index(move[0], move[1])]
+            is_quiet = self.is_quiet(position, move)
+
+            undo_info = position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move(move, undo_info)
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+
+            if alpha >= beta:
+                # Remember quiet moves that refute a position, they are tried early in sibling positions
+                if is_quiet:
+                    killers = self.killers[ply] if ply < len(self.killers) else [None, None]
+                    if move != killers[0]:
+                        killers[1], killers[0] = killers[0], move
+                    key = (piece, square_index(move[2], move[3]))
+                    self.history[key] = self.history.get(key, 0) + depth * depth
+                break
+
+        del position.position_counts[position.position_hash]
+
+        # The score is only a bound if the search failed low or high
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transposition_table.store(position.position_hash, depth, self.score_to_table(best_score, ply), bound, best_move)
+
+        return best_score
+
+
+    def score_to_table(self, score, ply):
+        """
+        Converts a mate score from distance to the root to distance to this node, so it stays valid in other searches.
+        """
+        if score >= MATE_BOUND:
+            return score + ply
+        if score <= -MATE_BOUND:
+            return score - ply
+        return score
+
+
+    def score_from_table(self, score, ply):
+        """
+        Converts a mate score read from the transposition table back to distance to the root.
+        """
+        if score >= MATE_BOUND:
+            return score - ply
+        if score <= -MATE_BOUND:
+            return score + ply
+        return score
+
+
+    def quiescence(self, position, alpha, beta, ply):
+        """
+        Searches only captures and promotions until the position is quiet, so the evaluation is not taken in the middle of an exchange.
+        """
+        self.check_limits()
+
+        stand_pat = self.evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        moves = [move for move in position.generate_legal_moves(position.current_player) if not self.is_quiet(position, move)]
+
+        for move in self.order_moves(position, moves, ply):
+            undo_info = position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move(move, undo_info)
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        return alpha
+
+
+    def order_moves(self, position, moves, ply, best_move=None):
+        """
+        Orders the moves so that the likely best are searched first: the previous best move, captures by
+        most valuable victim / least valuable attacker, promotions, killer moves and then the history heuristic.
+        """
+        killers = self.killers[ply] if ply < len(self.killers) else [None, None]
+        squares = position.squares
+
+        def move_priority(move):
+            if move == best_move:
+                return 10000000
+
+            start_square = square_index(move[0], move[1])
+            end_square = square_index(move[2], move[3])
+            attacker = squares[start_square]
+            victim = squares[end_square]
+
+            # En passant captures a pawn on an empty square
+            if victim == EMPTY and attacker & PIECE_TYPE_MASK == PAWN and move[1] != move[3]:
+                victim = PAWN
+
+            if victim != EMPTY:
+                return 1000000 + 10 * PIECE_TYPE_VALUES[victim & PIECE_TYPE_MASK] - PIECE_TYPE_VALUES[attacker & PIECE_TYPE_MASK]
+            if move[4]:
+                return 900000 + PIECE_VALUES[move[4].upper()]
+            if move == killers[0]:
+                return 800000
+            if move == killers[1]:
+                return 700000
+            return self.history.get((attacker, end_square), 0)
+
+        return sorted(moves, key=move_priority, reverse=True)
+
+
+    def is_quiet(self, position, move):
+        """
+        Checks if a move is neither a capture (including en passant) nor a promotion.
+        """
+        start_row, start_col, end_row, end_col, promotion = move
+        if promotion or position.squares[square_index(end_row, end_col)] != EMPTY:
+            return False
+        return not (position.squares[square_index(start_row, start_col)] & PIECE_TYPE_MASK == PAWN and start_col != end_col)
+
+
+    def in_check(self, position, color):
+        """
+        Checks if the king of the specified color is attacked.
+        """
+        king_square = position.bitboards.king_square(color)
+        return king_square is not None and position.bitboards.is_square_attacked(king_square, 'b' if color == 'w' else 'w')
+
+
+    def check_limits(self):
+        """
+        Counts a searched node and interrupts the search once the time limit is reached or a stop is requested.
+        """
+        self.nodes += 1
+
+        # Reading the clock is slow compared to a node, so only check it every so often
+        if self.nodes & 1023 == 0 and (self.stop_requested or (self.deadline is not None and time.perf_counter() > self.deadline)):
+            raise SearchTimeout()
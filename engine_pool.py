@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from uci_engine import EngineError, UCIEngine
+
+
+class EnginePool:
+
+    def __init__(self, path, size=None, threads=1, hash_mb=16, parameters=None, timeout=60.0, max_retries=2):
+        """
+        Starts size UCI engine processes (one per CPU core by default) that analyse positions from a shared work queue.
+        Each engine gets its own Threads and Hash settings, so N single-threaded engines keep N cores busy.
+        An engine that exits, or takes longer than timeout seconds on one position, is killed and replaced,
+        and the position is retried up to max_retries times before its future gets the error.
+        """
+        self.path = path
+        self.size = size or os.cpu_count() or 1
+        self.parameters = {'Threads': threads, 'Hash': hash_mb, **(parameters or {})}
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.tasks = queue.Queue()  # (fen, depth, future) items, None tells a worker to exit
+        self.lock = threading.Lock()
+        self.restarts = 0  # Number of engines replaced after crashing or hanging
+
+        # Start the engines up front, so a wrong path fails here rather than in the workers
+        self.workers = []
+        for index in range(self.size):
+            engine = self.start_engine()
+            worker = threading.Thread(target=self.run_worker, args=(engine,), name=f'engine-pool-{index}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def start_engine(self):
+        """
+        Starts one engine process with the pool's settings.
+        """
+        return UCIEngine(self.path, self.parameters)
+
+
+    def submit(self, fen, depth):
+        """
+        Queues a position for analysis and returns a Future of the final {'depth', 'type', 'value'} score
+        (from the point of view of the side to move), or None if the engine reported no score.
+        """
+        future = Future()
+        self.tasks.put((fen, depth, future))
+        return future
+
+
+    def analyse_positions(self, fens, depth):
+        """
+        Analyses all the positions in parallel and returns their final scores in the same order.
+        """
+        futures = [self.submit(fen, depth) for fen in fens]
+        return [future.result() for future in futures]
+
+
+    def analyse(self, engine, fen, depth):
+        """
+        Runs one search to the given depth and returns its deepest score.
+        A watchdog kills the engine if it does not finish in time, which ends the search with an EngineError.
+        """
+        watchdog = threading.Timer(self.timeout, engine.process.kill)
+        watchdog.start()
+        try:
+            result = None
+            for info in engine.analyse(fen, depth):
+                result = info
+            return result
+        finally:
+            watchdog.cancel()
+
+
+    def run_worker(self, engine):
+        """
+        Takes positions from the queue and analyses them with the worker's own engine until the pool is closed.
+        """
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+
+            fen, depth, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            error = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if engine is None:
+                        engine = self.start_engine()
+                    future.set_result(self.analyse(engine, fen, depth))
+                    error = None
+                    break
+                except (EngineError, OSError) as engine_error:
+                    # The engine crashed, hung or could not be started: replace it and try the position again
+                    error = engine_error
+                    if engine is not None:
+                        engine.quit()
+                        engine = None
+                    with self.lock:
+                        self.restarts += 1
+
+            if error is not None:
+                future.set_exception(error)
+
+        if engine is not None:
+            engine.quit()
+
+
+    def close(self):
+        """
+        Lets the workers finish the queued positions, then stops them and their engines.
+        """
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
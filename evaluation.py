@@ -0,0 +1,111 @@
+import math
+import queue
+import threading
+
+
+# Centipawn score given to a forced mate, so mates can be compared and averaged with ordinary scores
+MATE_CENTIPAWNS = 10000
+
+
+def win_probability(centipawns):
+    """
+    Converts a centipawn score to a winning probability between 0 and 1 for the same side.
+    """
+    return 1 / (1 + math.exp(-0.004 * centipawns))
+
+
+def score_to_centipawns(info, side_to_move):
+    """
+    Converts a parsed UCI score ({'type': 'cp' or 'mate', 'value': V}, from the side to move's point of view)
+    to centipawns from white's point of view. A mate in N counts as slightly less than MATE_CENTIPAWNS per move.
+    """
+    if info['type'] == 'mate':
+        # 'mate 0' means the side to move is already mated
+        value = MATE_CENTIPAWNS - abs(info['value']) if info['value'] > 0 else -MATE_CENTIPAWNS + abs(info['value'])
+    else:
+        value = info['value']
+
+    return value if side_to_move == 'w' else -value
+
+
+class EvaluationWorker:
+
+    def __init__(self, evaluate):
+        """
+        Starts a background thread that runs evaluate(fen) for the positions submitted to it,
+        so the GUI keeps drawing and handling input while the engine searches.
+        evaluate(fen, cancelled) is a generator yielding progressively refined results, which are passed on as they arrive.
+        It should stop as soon as it sees the cancelled event set, which happens when a newer position is submitted.
+        """
+        self.evaluate = evaluate  # Called with a FEN string and the cancel event, only ever from the worker thread
+        self.condition = threading.Condition()
+        self.cancelled = threading.Event()  # Set to stop the evaluation in progress, cleared when the next one starts
+        self.pending_fen = None  # The newest position waiting to be evaluated, older ones are dropped
+        self.running = True
+        self.results = queue.Queue()  # (fen, result) pairs sent back to the GUI thread
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def submit(self, fen):
+        """
+        Requests an evaluation of the position, replacing any request that has not started yet
+        and cancelling the evaluation in progress.
+        """
+        with self.condition:
+            self.pending_fen = fen
+            self.cancelled.set()
+            self.condition.notify()
+
+
+    def run(self):
+        """
+        Evaluates the newest pending position until the worker is stopped.
+        """
+        while True:
+            with self.condition:
+                while self.pending_fen is None and self.running:
+                    self.condition.wait()
+
+                if not self.running:
+                    return
+
+                fen, self.pending_fen = self.pending_fen, None
+                self.cancelled.clear()
+
+            evaluations = self.evaluate(fen, self.cancelled)
+            try:
+                for result in evaluations:
+                    # Drop results finished after a newer position was submitted
+                    if self.cancelled.is_set():
+                        break
+                    self.results.put((fen, result))
+            except Exception as error:
+                # Keep the worker alive so that the next position can still be evaluated
+                print(f'Evaluation failed: {error}')
+            finally:
+                evaluations.close()
+
+
+    def latest_result(self):
+        """
+        Returns the most recent (fen, result) pair finished by the worker, or None if there is no new result.
+        """
+        latest = None
+        while True:
+            try:
+                latest = self.results.get_nowait()
+            except queue.Empty:
+                return latest
+
+
+    def stop(self):
+        """
+        Stops the worker thread, cancelling the evaluation in progress (if any).
+        """
+        with self.condition:
+            self.running = False
+            self.cancelled.set()
+            self.condition.notify()
+        self.thread.join(timeout=1)
@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+
+
+def normalize_fen(fen):
+    """
+    Returns the part of a FEN that identifies the position for an engine: piece placement, side to move,
+    castling rights and en passant square, without the move clocks (which do not change the evaluation).
+    """
+    fields = fen.split()
+    placement, active_color, castling_rights, en_passant = fields[:4]
+
+    # Castling may be written with '-' placeholders for a missing right (e.g. 'K-kq')
+    castling_rights = ''.join(castling_right for castling_right in castling_rights if castling_right in 'KQkq') or '-'
+
+    return f'{placement} {active_color} {castling_rights} {en_passant}'
+
+
+class EvaluationCache:
+
+    def __init__(self, path, max_entries=200000):
+        """
+        Opens (or creates) the SQLite cache of engine evaluations and loads it into memory.
+        When it holds more than max_entries positions, the least recently used are removed.
+        """
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # The cache is created by the GUI but used from the evaluation thread
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS evaluations ('
+            'fen TEXT PRIMARY KEY, depth INTEGER NOT NULL, score INTEGER NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS evaluations_last_used ON evaluations (last_used)')
+
+        # Warm load every cached position, so lookups never wait on the disk
+        self.entries = {}  # normalized FEN -> (depth, score in centipawns from white's point of view)
+        self.use_counter = 0  # Increasing counter recording the order positions were last used in
+        for fen, depth, score, last_used in self.connection.execute('SELECT fen, depth, score, last_used FROM evaluations'):
+            self.entries[fen] = (depth, score)
+            self.use_counter = max(self.use_counter, last_used)
+
+        self.hits = 0
+        self.misses = 0
+        self.closed = False  # Set by close(), later lookups miss and later stores are dropped
+
+
+    def get(self, fen, depth):
+        """
+        Returns the cached (depth, score) of the position if it was evaluated to at least the given depth, otherwise None.
+        """
+        key = normalize_fen(fen)
+        with self.lock:
+            if self.closed:
+                return None
+
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < depth:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.use_counter += 1
+            self.connection.execute('UPDATE evaluations SET last_used = ? WHERE fen = ?', (self.use_counter, key))
+            return entry
+
+
+    def put(self, fen, depth, score):
+        """
+        Stores the evaluation of the position, unless a deeper one is already cached or the cache is closed.
+        """
+        key = normalize_fen(fen)
+        with self.lock:
+            if self.closed:
+                return
+
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > depth:
+                return
+
+            self.entries[key] = (depth, score)
+            self.use_counter += 1
+            self.connection.execute(
+                'INSERT OR REPLACE INTO evaluations (fen, depth, score, last_used) VALUES (?, ?, ?, ?)',
+                (key, depth, score, self.use_counter),
+            )
+
+            if len(self.entries) > self.max_entries:
+                self.evict()
+
+
+    def evict(self):
+        """
+        Removes the least recently used tenth of the entries, so eviction does not run on every insert.
+        """
+        evict_count = max(1, self.max_entries // 10)
+        oldest = [row[0] for row in self.connection.execute(
+            'SELECT fen FROM evaluations ORDER BY last_used LIMIT ?', (len(self.entries) - self.max_entries + evict_count,)
+        )]
+
+        self.connection.executemany('DELETE FROM evaluations WHERE fen = ?', ((fen,) for fen in oldest))
+        for fen in oldest:
+            self.entries.pop(fen, None)
+
+
+    def close(self):
+        """
+        Closes the database. Evaluations finishing after this are not stored.
+        """
+        with self.lock:
+            self.closed = True
+            self.connection.close()
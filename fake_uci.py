@@ -0,0 +1,136 @@
+import argparse
+import sys
+import threading
+import time
+
+
+# Material values used for the fake evaluation, in centipawns
+MATERIAL_VALUES = {'p': 100, 'n': 300, 'b': 300, 'r': 500, 'q': 900, 'k': 0}
+
+
+def material_score(fen):
+    """
+    Returns the material balance of the FEN position in centipawns, from the point of view of the side to move.
+    """
+    fields = fen.split()
+    placement, active_color = fields[0], fields[1]
+
+    score = 0
+    for notation in placement:
+        if notation.lower() in MATERIAL_VALUES:
+            value = MATERIAL_VALUES[notation.lower()]
+            score += value if notation.isupper() else -value
+
+    return score if active_color == 'w' else -score
+
+
+class FakeEngine:
+
+    def __init__(self, delay=0.01, crash_after=None, hang_after=None):
+        """
+        Stand-in for Stockfish that speaks enough UCI for the GUI and the engine pool: it answers the handshake
+        and reports a deterministic material score at every depth of a 'go depth N' search.
+        crash_after and hang_after make it exit or stop answering after that many searches, to exercise recovery.
+        """
+        self.delay = delay  # Seconds spent on each depth
+        self.crash_after = crash_after
+        self.hang_after = hang_after
+
+        self.fen = None
+        self.searches = 0
+        self.search_thread = None
+        self.stop_event = threading.Event()
+
+
+    def search(self, depth):
+        """
+        Reports one info line per depth until the depth is reached or the search is stopped, then the best move.
+        """
+        score = material_score(self.fen)
+        for current_depth in range(1, depth + 1):
+            if self.stop_event.is_set():
+                break
+            time.sleep(self.delay)
+            print(f'info depth {current_depth} seldepth {current_depth} score cp {score} nodes {1000 * current_depth}', flush=True)
+
+        print('bestmove 0000', flush=True)
+
+
+    def wait_for_search(self):
+        """
+        Waits for the search in progress, if any, to finish.
+        """
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+
+
+    def handle_command(self, tokens):
+        """
+        Handles one UCI command. Returns False when the engine should exit.
+        """
+        command = tokens[0]
+
+        if command == 'uci':
+            print('id name FakeUCI', flush=True)
+            print('uciok', flush=True)
+
+        elif command == 'isready':
+            self.wait_for_search()
+            print('readyok', flush=True)
+
+        elif command == 'position':
+            # Only 'position fen ...' is supported, moves after the FEN are ignored
+            if 'fen' in tokens:
+                fen_start = tokens.index('fen') + 1
+                fen_end = tokens.index('moves') if 'moves' in tokens else len(tokens)
+                self.fen = ' '.join(tokens[fen_start:fen_end])
+
+        elif command == 'go':
+            self.wait_for_search()
+            self.searches += 1
+
+            if self.crash_after is not None and self.searches > self.crash_after:
+                return False
+            if self.hang_after is not None and self.searches > self.hang_after:
+                # Never answer again, like an engine stuck in a search
+                while True:
+                    time.sleep(60)
+
+            depth = int(tokens[tokens.index('depth') + 1]) if 'depth' in tokens else 1
+            self.stop_event.clear()
+            self.search_thread = threading.Thread(target=self.search, args=(depth,))
+            self.search_thread.start()
+
+        elif command == 'stop':
+            self.stop_event.set()
+
+        elif command == 'quit':
+            self.stop_event.set()
+            return False
+
+        # Any other command (setoption, ucinewgame, ...) is accepted and ignored
+        return True
+
+
+    def run(self):
+        """
+        Reads commands from stdin until 'quit' or the end of input.
+        """
+        for line in sys.stdin:
+            tokens = line.split()
+            if tokens and not self.handle_command(tokens):
+                break
+
+        self.stop_event.set()
+        self.wait_for_search()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake UCI engine for testing without Stockfish")
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds spent on each search depth")
+    parser.add_argument("--crash-after", type=int, default=None, help="exit when asked for more than this many searches")
+    parser.add_argument("--hang-after", type=int, default=None, help="stop responding after this many searches")
+    args = parser.parse_args()
+
+    FakeEngine(args.delay, args.crash_after, args.hang_after).run()
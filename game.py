@@ -1,17 +1,26 @@
 import pygame
+import argparse
 import os
+import threading
 import time
-import math
 
 from chessboard import Chessboard
 from config import *
-from stockfish import Stockfish
-
-stockfish = Stockfish(
-    path=r"stockfish\stockfish-windows-x86-64-avx2.exe", # Replace with path to locally stored stockfish directory
-    depth=12,
-    parameters={"Threads": 2, "Minimum Thinking Time": 30},
-)
+from engine import Engine
+from evaluation import EvaluationWorker, score_to_centipawns, win_probability
+from evaluation_cache import EvaluationCache
+from sprites import SPRITES
+from uci_engine import EngineError, UCIEngine
+
+try:
+    stockfish = UCIEngine(
+        path=STOCKFISH_PATH,
+        parameters={"Threads": 2, "Minimum Thinking Time": 30},
+    )
+except (OSError, EngineError):
+    # The game can still be played (including against the built-in engine) without the evaluation bar
+    print('Stockfish could not be started, the evaluation bar is disabled')
+    stockfish = None
 
 
 class Topbar:
@@ -22,12 +31,43 @@ class Topbar:
         self.color = color
         self.chessboard = chessboard
         self.evaluation_result = 0
+        self.outcome_message = None  # Check or game over message of the position on the board, if any
+        self.dirty = True  # Whether the evaluation or the message changed since the top bar was last drawn
 
     def draw(self):
         pygame.draw.rect(self.window, self.color, (0, 0, self.width, self.height))
         self.draw_horizontal_line()
         self.draw_evaluation_bar()
         self.draw_evaluation_text()
+        self.draw_outcome_message()
+        self.dirty = False
+
+    def draw_dirty(self):
+        # Only redraw the top bar (evaluation bar and text) when the evaluation has changed
+        if not self.dirty:
+            return []
+        self.draw()
+        return [pygame.Rect(0, 0, self.width, self.height)]
+
+    def set_evaluation_result(self, evaluation_result):
+        if evaluation_result != self.evaluation_result:
+            self.evaluation_result = evaluation_result
+            self.dirty = True
+
+    def set_outcome_message(self, outcome_message):
+        if outcome_message != self.outcome_message:
+            self.outcome_message = outcome_message
+            self.dirty = True
+
+    def draw_outcome_message(self):
+        if not self.outcome_message:
+            return
+
+        # Shown in the strip between the evaluation bar and the line at the bottom of the top bar
+        font = pygame.font.Font(None, 20)
+        text = font.render(self.outcome_message, True, (255, 200, 60))
+        text_y = self.height - LINE_THICKNESS - text.get_height() - 1
+        self.window.blit(text, (2 * LINE_THICKNESS, text_y))
 
     def draw_horizontal_line(self):
         line_color = (40, 40, 40)
@@ -72,7 +112,7 @@ class Topbar:
 
 class Sidebar:
 
-    def __init__(self, window, width, height, color, x_pos, y_pos, chessboard):
+    def __init__(self, window, width, height, color, x_pos, y_pos, chessboard, computer_color=None):
         self.window = window
         self.width = width
         self.height = height
@@ -80,18 +120,26 @@ class Sidebar:
         self.x_pos = x_pos
         self.y_pos = y_pos
         self.restart_button_rect = None  # Initialize restart_button_rect as None
+        self.undo_button_rect = None  # Initialize undo_button_rect as None
         self.chessboard = chessboard  # Store a reference to the Chessboard instance
+        self.computer_color = computer_color  # The side played by the built-in engine, if any
+        self.render_scheduler = None  # Asked to redraw the whole window when the game is restarted
 
         self.white_captured_rect = pygame.Rect(self.x_pos + 15, self.y_pos + 40, self.width - 30, 100)
         self.black_captured_rect = pygame.Rect(self.x_pos + 15, self.y_pos + 180, self.width - 30, 100)
 
         # New attributes for titles
-        self.white_title = "White: Player 1"
-        self.black_title = "Black: Player 2"
+        self.white_title = "White: Computer" if computer_color == 'w' else "White: Player 1"
+        self.black_title = "Black: Computer" if computer_color == 'b' else "Black: Player 2"
+
+        # The captured pieces shown in each panel when they were last drawn
+        self.drawn_white_captured = None
+        self.drawn_black_captured = None
         
     def draw(self):
         pygame.draw.rect(self.window, self.color, (self.x_pos, self.y_pos, self.width, self.height))
         self.draw_restart_button()
+        self.draw_undo_button()
 
         # Draw Player: White title
         white_title_font = pygame.font.Font(None, 20)
@@ -104,12 +152,34 @@ class Sidebar:
         self.window.blit(black_title_text, (self.x_pos + 15, self.y_pos + 160))
 
         # Draw Player: White captured pieces
+        self.draw_white_captured_panel()
+
+        # Draw Player: Black captured pieces
+        self.draw_black_captured_panel()
+
+
+    def draw_dirty(self):
+        # Only the captured piece panels change during a game, redraw the ones whose pieces changed
+        rects = []
+        if self.chessboard.white_captured_pieces != self.drawn_white_captured:
+            self.draw_white_captured_panel()
+            rects.append(self.white_captured_rect)
+        if self.chessboard.black_captured_pieces != self.drawn_black_captured:
+            self.draw_black_captured_panel()
+            rects.append(self.black_captured_rect)
+        return rects
+
+
+    def draw_white_captured_panel(self):
         pygame.draw.rect(self.window, (255, 255, 255), self.white_captured_rect)
         self.draw_captured_pieces(self.white_captured_rect, self.chessboard.white_captured_pieces)
+        self.drawn_white_captured = list(self.chessboard.white_captured_pieces)
 
-        # Draw Player: Black captured pieces
+
+    def draw_black_captured_panel(self):
         pygame.draw.rect(self.window, (0, 0, 0), self.black_captured_rect)
         self.draw_captured_pieces(self.black_captured_rect, self.chessboard.black_captured_pieces)
+        self.drawn_black_captured = list(self.chessboard.black_captured_pieces)
 
 
     def draw_captured_pieces(self, rect, captured_pieces):
@@ -124,9 +194,8 @@ class Sidebar:
             piece_x = x + col * (piece_size + 5)
             piece_y = y + row * (piece_size + 5)
 
-            image_path = os.path.join("assets", PIECE_MAPPING[piece_notion])
-            image = pygame.image.load(image_path)
-            scaled_image = pygame.transform.scale(image, (piece_size, piece_size))
+            # The sprite cache loads and scales each piece image once instead of on every redraw
+            scaled_image = SPRITES.sprite(piece_notion, piece_size)
             self.window.blit(scaled_image, (piece_x, piece_y))
 
 
@@ -152,6 +221,27 @@ class Sidebar:
         self.restart_button_rect = restart_button_rect
 
 
+    def draw_undo_button(self):
+
+        undo_button_width = self.width - 30
+        undo_button_height = 25
+        undo_button_x = self.x_pos + (self.width - undo_button_width) // 2
+        undo_button_y = self.y_pos + (WINDOW_HEIGHT - TOP_BAR_HEIGHT) - 2 * undo_button_height - 25  # Above the restart button
+
+        undo_button_color = (120, 120, 120)
+
+        undo_button_rect = pygame.Rect(undo_button_x, undo_button_y, undo_button_width, undo_button_height)
+        pygame.draw.rect(self.window, undo_button_color, undo_button_rect)
+
+        font = pygame.font.Font(None, 30)
+        text = font.render("Undo", True, (0, 0, 0))
+        text_rect = text.get_rect(center=(undo_button_x + undo_button_width / 2, undo_button_y + undo_button_height / 2))
+        self.window.blit(text, text_rect)
+
+        # Save the undo button rectangle for click detection in handle_mouse_event
+        self.undo_button_rect = undo_button_rect
+
+
     def handle_mouse_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 1:  # Left button
@@ -162,43 +252,151 @@ class Sidebar:
                     # Handle the click on the restart button here
                     print("Game Restarted")
                     self.chessboard.reset_game()
+                    if self.render_scheduler is not None:
+                        self.render_scheduler.request_full_redraw()
 
+                # Check if the click is within the undo button's rectangular area
+                elif self.undo_button_rect.collidepoint(x, y):
+                    self.chessboard.undo_last_move()
 
-class Evaluation:
-    def __init__(self):
-        self.depth = 12  # Initial depth for Stockfish evaluation
-        self.previous_fen = None  # Variable to store the previous FEN
+                    # Against the computer also take back its reply, so that it is the player's turn again
+                    if self.computer_color is not None and self.chessboard.current_player == self.computer_color:
+                        self.chessboard.undo_last_move()
+
+
+class RenderScheduler:
+
+    def __init__(self, window, chessboard, top_bar, side_bar):
+        self.window = window
+        self.chessboard = chessboard
+        self.top_bar = top_bar
+        self.side_bar = side_bar
+        self.full_redraw = True  # The first frame draws the whole window
+
+
+    def request_full_redraw(self):
+        """
+        Makes the next frame draw and flip the whole window, e.g. after the game is restarted.
+        """
+        self.full_redraw = True
+
+
+    def render(self):
+        """
+        Draws the regions that changed since the last frame and pushes only their rectangles to the display.
+        Called once per frame, it does nothing when nothing has changed.
+        """
+        if self.full_redraw:
+            self.chessboard.draw(self.window)
+            self.top_bar.draw()
+            self.side_bar.draw()
+            pygame.display.flip()
+            self.full_redraw = False
+            return
+
+        # Moved and (de)selected squares, the evaluation bar and the captured piece panels
+        dirty_rects = self.chessboard.draw_dirty(self.window) + self.top_bar.draw_dirty() + self.side_bar.draw_dirty()
+
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
 
 
-    def sigmoid(self, x):
-        return 1 / (1 + math.exp(-0.004 * x))
+class ComputerPlayer:
+
+    def __init__(self, color, chessboard):
+        self.color = color  # The side played by the computer ('w' or 'b')
+        self.chessboard = chessboard
+        self.engine = Engine(max_depth=ENGINE_MAX_DEPTH, time_limit=ENGINE_TIME_LIMIT, hash_size_mb=ENGINE_HASH_MB)
+        self.thread = None  # The thread running the search, while the computer is thinking
+        self.best_move = None
+        self.search_state = None  # The game state the running search was started from
+        self.no_move_state = None  # A game state in which the computer found no legal move (game over)
 
 
-    def stockfish_evaluation(self, fen_string):
+    def game_state(self):
+        # The position hash alone would not tell apart a position repeated later in the game
+        return self.chessboard.position_hash, len(self.chessboard.moves)
+
+
+    def update(self):
         """
-        Returns the centripawns evaluation from Stockfish for the current board position
+        Called once per frame, starts a search on the computer's turn and plays its move once the search is finished.
         """
-        if stockfish.is_fen_valid(fen_string):
-            stockfish.set_fen_position(fen_string)
-            evaluation = stockfish.get_evaluation()
+        state = self.game_state()
+
+        if self.thread is not None:
+            if self.thread.is_alive():
+                # Stop thinking about a position taken back by undo or restart
+                if state != self.search_state:
+                    self.engine.stop()
+                return
+
+            self.thread = None
+            if self.best_move is None:
+                self.no_move_state = self.search_state
+            elif state == self.search_state:
+                self.chessboard.apply_move(self.best_move)
+            return
 
-            if evaluation['type'] == "cp":
-                centipawn_evaluation = int(evaluation['value'])
-                white_win_prob = self.sigmoid(centipawn_evaluation)
-                return white_win_prob
+        if self.chessboard.current_player == self.color and state != self.no_move_state:
+            # The search runs on a copy of the position, in a thread so that the window keeps responding
+            self.search_state = state
+            self.best_move = None
+            self.thread = threading.Thread(target=self.search, args=(self.chessboard.copy(),), daemon=True)
+            self.thread.start()
 
-        else:
-            print('Invalid FEN')
 
+    def search(self, position):
+        self.best_move, score, depth = self.engine.search(position)
+
+
+class Evaluation:
+    def __init__(self, cache=None):
+        self.depth = 12  # Final depth of the Stockfish evaluation, shallower depths are reported on the way
+        self.cache = cache  # Optional EvaluationCache of earlier Stockfish results
+        self.previous_fen = None  # Variable to store the previous FEN
+
+
+    def stockfish_evaluation(self, fen_string, cancelled=None):
+        """
+        Yields (depth, white winning probability) from Stockfish for the current board position after each depth
+        of its iterative deepening search, so a rough evaluation is available long before the final one.
+        Closing the generator or setting the cancelled event stops the search.
+        Positions already evaluated to the full depth are served from the cache.
+        """
+        cached = self.cache.get(fen_string, self.depth) if self.cache is not None else None
+        if cached is not None:
+            depth, centipawn_evaluation = cached
+            yield depth, win_probability(centipawn_evaluation)
+            return
 
+        # Stockfish scores from the point of view of the side to move, the evaluation bar is from white's
+        side_to_move = fen_string.split()[1]
 
+        deepest = None  # (depth, centipawns) of the deepest result, stored even if the search is stopped early
+        try:
+            for info in stockfish.analyse(fen_string, self.depth, cancelled):
+                centipawn_evaluation = score_to_centipawns(info, side_to_move)
+                deepest = info['depth'], centipawn_evaluation
+                white_win_prob = win_probability(centipawn_evaluation)
+                yield info['depth'], white_win_prob
+        finally:
+            if deepest is not None and self.cache is not None:
+                self.cache.put(fen_string, *deepest)
 
-def main():
+
+
+
+def main(computer_color=COMPUTER_COLOR):
     pygame.init()
 
     window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Chessboard")
 
+    # Load every piece image once, now that the display exists they can be converted for fast blits
+    SPRITES.load()
+    SPRITES.set_square_size(SQUARE_SIZE)
+
     chessboard = Chessboard(window)
     chessboard.initialize_board()
 
@@ -206,44 +404,80 @@ def main():
     window.fill((255, 255, 255))
 
     top_bar = Topbar(window, WINDOW_WIDTH, TOP_BAR_HEIGHT, (20, 20, 20), chessboard)
-    side_bar = Sidebar(window, SIDE_BAR_WIDTH, WINDOW_HEIGHT - TOP_BAR_HEIGHT, (10, 10, 10), WINDOW_WIDTH - SIDE_BAR_WIDTH, TOP_BAR_HEIGHT, chessboard)
+    side_bar = Sidebar(window, SIDE_BAR_WIDTH, WINDOW_HEIGHT - TOP_BAR_HEIGHT, (10, 10, 10), WINDOW_WIDTH - SIDE_BAR_WIDTH, TOP_BAR_HEIGHT, chessboard, computer_color)
 
-    evaluation = Evaluation()
+    # The cache is only needed for Stockfish results
+    evaluation_cache = EvaluationCache(EVALUATION_CACHE_PATH, EVALUATION_CACHE_SIZE) if stockfish else None
+    evaluation = Evaluation(evaluation_cache)
 
-    last_evaluation_time = 0  # Variable to store the last time the evaluation was triggered
+    # Stockfish runs in a background thread, the GUI only submits positions and collects the results
+    evaluation_worker = EvaluationWorker(evaluation.stockfish_evaluation) if stockfish else None
+
+    computer_player = ComputerPlayer(computer_color, chessboard) if computer_color else None
+
+    render_scheduler = RenderScheduler(window, chessboard, top_bar, side_bar)
+    side_bar.render_scheduler = render_scheduler
+    clock = pygame.time.Clock()
+
+    turn_text = None
 
     running = True
     while running:
-        current_time = time.time()  # Get the current time
-
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
-            chessboard.draw(window)
-            top_bar.draw()
-            side_bar.draw()
-
-            fen_string = chessboard.current_fen
-
-            # Check if it's time to trigger the evaluation and the FEN position changed
-            if current_time - last_evaluation_time >= 0.5 and fen_string != evaluation.previous_fen:
-                top_bar.evaluation_result = evaluation.stockfish_evaluation(fen_string)
-                last_evaluation_time = current_time  # Update the last evaluation time
-
-            evaluation.previous_fen = fen_string
-
-            chessboard.handle_mouse_event(event)
+            # The player cannot move the computer's pieces
+            if computer_player is None or chessboard.current_player != computer_player.color:
+                chessboard.handle_mouse_event(event)
             top_bar.handle_mouse_event(event)
             side_bar.handle_mouse_event(event)
 
-        turn_text = "White's Turn" if chessboard.current_player == 'w' else "Black's Turn"
-        pygame.display.set_caption(f"Chessboard - {turn_text}")
+        if computer_player is not None:
+            computer_player.update()
+
+        fen_string = chessboard.current_fen
 
-        pygame.display.flip()
+        # Request an evaluation whenever the FEN position changed, replacing any stale request
+        if evaluation_worker is not None and fen_string != evaluation.previous_fen:
+            evaluation_worker.submit(fen_string)
+            evaluation.previous_fen = fen_string
 
+        # Refine the evaluation bar with each new depth, if the result is still for the position on the board
+        result = evaluation_worker.latest_result() if evaluation_worker is not None else None
+        if result is not None:
+            result_fen, (depth, evaluation_result) = result
+            if result_fen == chessboard.current_fen:
+                top_bar.set_evaluation_result(evaluation_result)
+
+        # Show check and game over messages, the outcome is cached for each position so this is only a lookup
+        top_bar.set_outcome_message(chessboard.check_for_outcome().message)
+
+        # Draw at most once per frame, only the parts of the window that changed
+        render_scheduler.render()
+
+        # Only update the window title when the turn changes
+        new_turn_text = "White's Turn" if chessboard.current_player == 'w' else "Black's Turn"
+        if new_turn_text != turn_text:
+            turn_text = new_turn_text
+            pygame.display.set_caption(f"Chessboard - {turn_text}")
+
+        # Sleep for the rest of the frame so the loop stays near idle when nothing changes
+        clock.tick(FRAME_RATE)
+
+    if evaluation_worker is not None:
+        evaluation_worker.stop()
+        # Quitting the engine also ends a read the worker may still be waiting on
+        stockfish.quit()
+        # The worker stores its last result in the cache when it finishes, so only close the cache after it
+        evaluation_worker.thread.join()
+        evaluation_cache.close()
     pygame.quit()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chess GUI")
+    parser.add_argument("--computer", choices=['w', 'b'], default=COMPUTER_COLOR, help="let the built-in engine play this side")
+    args = parser.parse_args()
+
+    main(args.computer)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from position import Position
+
+
+# Standard perft test positions with their known node counts for depth 1, 2, 3, ...
+PERFT_POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("en_passant", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("promotion", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("promotion_check", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+# Split the tree until there are at least this many tasks per worker process, so the workers finish close together
+TASKS_PER_JOB = 4
+
+MAX_SPLIT_DEPTH = 2
+
+
+def split_work(fen, depth, jobs, split_depth=None):
+    """
+    Splits a perft of the position into tasks of (root move in UCI notation, FEN after the split moves, remaining depth).
+    The tree is split at the root moves, or at the second ply (split_depth) when the root has too few moves to keep every job busy.
+    Positions are passed to the workers as FEN strings, which are small to send and hold everything perft needs.
+    """
+    position = Position(fen)
+    if split_depth is None:
+        root_moves = len(position.generate_legal_moves(position.current_player))
+        split_depth = 1 if root_moves >= TASKS_PER_JOB * jobs else MAX_SPLIT_DEPTH
+    split_depth = max(1, min(split_depth, depth - 1))
+
+    tasks = []
+
+    def add_tasks(root_move, ply):
+        moves = position.generate_legal_moves(position.current_player) if ply < split_depth else []
+
+        # A game that ends before the split depth still gets its (empty) task, so its root move appears in the divide
+        if not moves:
+            tasks.append((root_move, position.to_fen(), depth - ply))
+            return
+
+        for move in moves:
+            undo_info = position.make_move(move)
+            add_tasks(root_move or position.move_tuple_to_uci(move), ply + 1)
+            position.unmake_move(move, undo_info)
+
+    add_tasks(None, 0)
+    return tasks
+
+
+def perft_task(task):
+    """
+    Runs the perft of one task in a worker process and returns (root move, nodes, seconds, worker process id).
+    """
+    root_move, fen, depth = task
+    start_time = time.perf_counter()
+    nodes = Position(fen).perft(depth)
+    return root_move, nodes, time.perf_counter() - start_time, os.getpid()
+
+
+def parallel_perft(fen, depth, executor, jobs, split_depth=None):
+    """
+    Runs perft with the subtrees shared between the worker processes of the executor.
+    Returns the divide (nodes below each root move) and {worker process id: [tasks, nodes, busy seconds]}.
+    """
+    if depth < 2:
+        # Nothing to split, the root moves are the whole tree
+        divide = Position(fen).divide(depth)
+        return divide, {os.getpid(): [1, sum(divide.values()), 0.0]}
+
+    divide = {}
+    workers = {}
+    futures = [executor.submit(perft_task, task) for task in split_work(fen, depth, jobs, split_depth)]
+    for future in as_completed(futures):
+        root_move, nodes, seconds, worker = future.result()
+        divide[root_move] = divide.get(root_move, 0) + nodes
+
+        worker_stats = workers.setdefault(worker, [0, 0, 0.0])
+        worker_stats[0] += 1
+        worker_stats[1] += nodes
+        worker_stats[2] += seconds
+
+    return divide, workers
+
+
+def print_worker_stats(workers, elapsed):
+    """
+    Prints the tasks, nodes and busy time of each worker process, and the share of the wall time it was busy.
+    """
+    for index, (worker, (tasks, nodes, seconds)) in enumerate(sorted(workers.items())):
+        print(f"    worker {index:<3} pid {worker:<8} tasks {tasks:>5}  nodes {nodes:>10}  busy {seconds:8.3f}s  "
+              f"({seconds / max(elapsed, 1e-9) * 100:5.1f}% of {elapsed:.3f}s)")
+
+
+def run_perft(position, name, fen, expected_counts, max_depth, executor=None, jobs=1, split_depth=None):
+    """
+    Runs perft on one position at increasing depth, printing the node counts and speed.
+    With an executor, each depth is split across its worker processes and the time of every worker is printed.
+    Returns the results and whether every count matched the known value.
+    """
+    position.set_fen(fen)
+    results = []
+    passed = True
+
+    for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+        start_time = time.perf_counter()
+        if executor is None:
+            nodes = position.perft(depth)
+        else:
+            divide, workers = parallel_perft(fen, depth, executor, jobs, split_depth)
+            nodes = sum(divide.values())
+        elapsed = time.perf_counter() - start_time
+
+        nodes_per_second = nodes / elapsed if elapsed > 0 else float('inf')
+        correct = nodes == expected_counts[depth - 1]
+        passed = passed and correct
+
+        print(f"{name:<16} depth {depth}  nodes {nodes:>10}  expected {expected_counts[depth - 1]:>10}  "
+              f"{'OK  ' if correct else 'FAIL'}  {elapsed:8.3f}s  {nodes_per_second:>10.0f} nodes/s")
+        if executor is not None:
+            print_worker_stats(workers, elapsed)
+        results.append({"name": name, "depth": depth, "nodes": nodes, "seconds": elapsed, "nodes_per_second": nodes_per_second})
+
+    return results, passed
+
+
+def compare_to_baseline(results, baseline_path):
+    """
+    Prints the nodes/sec change of each result against a baseline saved by a previous run.
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = {(result["name"], result["depth"]): result for result in json.load(baseline_file)}
+
+    print(f"\nChange against {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result["name"], result["depth"]))
+        if previous:
+            change = (result["nodes_per_second"] / previous["nodes_per_second"] - 1) * 100
+            print(f"{result['name']:<16} depth {result['depth']}  {previous['nodes_per_second']:>10.0f} -> "
+                  f"{result['nodes_per_second']:>10.0f} nodes/s  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft correctness and speed benchmark for the chess rule engine")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth to search each position to")
+    parser.add_argument("--position", choices=[name for name, _, _ in PERFT_POSITIONS], help="only run this position")
+    parser.add_argument("--fen", help="run a divide on this FEN instead of the standard positions")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare nodes/sec against")
+    parser.add_argument("--save", help="save the results as JSON to use as a future baseline")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes to split the move tree across (0: one per core)")
+    parser.add_argument("--split-depth", type=int, choices=range(1, MAX_SPLIT_DEPTH + 1),
+                        help="split the tree at the root moves (1) or the second ply (2) (default: the second ply when the root has too few moves)")
+    args = parser.parse_args()
+
+    jobs = args.jobs or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(jobs) if jobs > 1 else None
+    try:
+        run_benchmark(args, jobs, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def run_benchmark(args, jobs, executor):
+    """
+    Runs the divide or the perft benchmark selected on the command line, serially or on the executor.
+    """
+
+    # The headless rule engine, so the benchmark does not need pygame or the piece images
+    position = Position()
+
+    # Divide a custom position, printing the count below each root move to help find move generation bugs
+    if args.fen:
+        start_time = time.perf_counter()
+        if executor is None:
+            position.set_fen(args.fen)
+            divide = position.divide(args.depth)
+        else:
+            divide, workers = parallel_perft(args.fen, args.depth, executor, jobs, args.split_depth)
+        elapsed = time.perf_counter() - start_time
+
+        for uci_move, nodes in sorted(divide.items()):
+            print(f"{uci_move}: {nodes}")
+        print(f"\nMoves: {len(divide)}  Nodes: {sum(divide.values())}  ({elapsed:.3f}s, {sum(divide.values()) / max(elapsed, 1e-9):.0f} nodes/s)")
+        if executor is not None:
+            print_worker_stats(workers, elapsed)
+        return
+
+    results = []
+    all_passed = True
+    for name, fen, expected_counts in PERFT_POSITIONS:
+        if args.position is None or args.position == name:
+            position_results, passed = run_perft(position, name, fen, expected_counts, args.depth, executor, jobs, args.split_depth)
+            results.extend(position_results)
+            all_passed = all_passed and passed
+
+    total_nodes = sum(result["nodes"] for result in results)
+    total_seconds = sum(result["seconds"] for result in results)
+    print(f"\nTotal: {total_nodes} nodes in {total_seconds:.3f}s ({total_nodes / total_seconds:.0f} nodes/s)")
+
+    if args.baseline and os.path.exists(args.baseline):
+        compare_to_baseline(results, args.baseline)
+
+    if args.save:
+        with open(args.save, "w") as save_file:
+            json.dump(results, save_file, indent=2)
+
+    # A wrong node count fails the run so the benchmark can be used as a regression check
+    if not all_passed:
+        print("\nPerft node counts do not match the expected values")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
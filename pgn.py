@@ -0,0 +1,322 @@
+import argparse
+import re
+import sys
+import time
+
+from position import COLUMN_LETTERS, STARTING_FEN, Position
+
+
+# Tag pairs every exported game starts with, in the standard order (the "seven tag roster")
+SEVEN_TAG_ROSTER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result']
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+
+# Comments, NAGs, variation brackets and everything else (move numbers, moves and results) as separate tokens
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|[()]|[^\s(){};$]+')
+
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.*')
+
+SAN_PATTERN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?')
+
+REFERENCE_FILE = 'reference_games.pgn'
+
+
+class PGNGame:
+
+    def __init__(self, headers, san_moves, result='*'):
+        """
+        Holds one game read from a PGN file: its tag pairs, its main line in SAN (Standard Algebraic Notation) and its result.
+        """
+        self.headers = headers  # Tag name -> value, e.g. {'White': 'Morphy', 'Result': '1-0'}
+        self.san_moves = san_moves
+        self.result = result
+
+
+    @property
+    def start_fen(self):
+        """
+        The position the game starts from, which is only different from the standard one for games with a FEN tag.
+        """
+        return self.headers.get('FEN', STARTING_FEN)
+
+
+    def uci_moves(self):
+        """
+        Replays the game through the rule engine and returns its moves in UCI notation.
+        Raises ValueError at the first illegal or ambiguous move.
+        """
+        position = Position(self.start_fen)
+        uci_moves = []
+
+        for ply, san in enumerate(self.san_moves, start=1):
+            try:
+                move = san_to_move(position, san)
+            except ValueError as error:
+                raise ValueError(f"{error} at ply {ply}") from None
+
+            uci_moves.append(position.move_tuple_to_uci(move))
+            position.play_move(move)
+
+        return uci_moves
+
+
+def move_to_san(position, move, legal_moves=None):
+    """
+    Returns the SAN of a legal move in the position (e.g. 'Nbd7', 'exd5', 'e8=Q+', 'O-O-O'),
+    naming the start file or rank only when another piece of the same type could also move to the destination.
+    """
+    start_row, start_col, end_row, end_col, promotion = move
+    notation = position.piece_at(start_row, start_col)
+    piece_type = notation.upper()
+    destination = position.coord_to_square_notation((end_row, end_col))
+
+    if piece_type == 'K' and abs(end_col - start_col) == 2:
+        san = 'O-O' if end_col > start_col else 'O-O-O'
+
+    elif piece_type == 'P':
+        # Pawn captures (including en passant) are named by the pawn's file
+        if start_col != end_col:
+            san = COLUMN_LETTERS[start_col] + 'x' + destination
+        else:
+            san = destination
+        if promotion:
+            san += '=' + promotion.upper()
+
+    else:
+        if legal_moves is None:
+            legal_moves = position.current_legal_moves()
+
+        # Other pieces of the same type that can move to the same square
+        rivals = [
+            (rival_row, rival_col) for rival_row, rival_col, rival_end_row, rival_end_col, _ in legal_moves
+            if (rival_end_row, rival_end_col) == (end_row, end_col) and (rival_row, rival_col) != (start_row, start_col)
+            and position.piece_at(rival_row, rival_col) == notation
+        ]
+
+        disambiguation = ''
+        if rivals:
+            if all(rival_col != start_col for _, rival_col in rivals):
+                disambiguation = COLUMN_LETTERS[start_col]
+            elif all(rival_row != start_row for rival_row, _ in rivals):
+                disambiguation = str(8 - start_row)
+            else:
+                disambiguation = position.coord_to_square_notation((start_row, start_col))
+
+        capture = 'x' if position.piece_at(end_row, end_col) is not None else ''
+        san = piece_type + disambiguation + capture + destination
+
+    # Mark checks and checkmates by playing the move
+    undo_info = position.make_move(move)
+    opponent_color = position.current_player
+    if position.check_for_check(position.find_king_position(opponent_color), opponent_color):
+        san += '+' if position.has_legal_moves(opponent_color) else '#'
+    position.unmake_move(move, undo_info)
+
+    return san
+
+
+def san_to_move(position, san, legal_moves=None):
+    """
+    Returns the legal move matching the SAN in the position, raising ValueError if there is none or several.
+    """
+    text = san.rstrip('+#!?')
+    if legal_moves is None:
+        legal_moves = position.current_legal_moves()
+
+    # Castling is written as a king move of two squares towards the rook
+    if text in ('O-O', 'O-O-O', '0-0', '0-0-0'):
+        direction = 1 if text in ('O-O', '0-0') else -1
+        for move in legal_moves:
+            start_row, start_col, end_row, end_col, _ = move
+            if position.piece_at(start_row, start_col) in 'Kk' and end_col - start_col == 2 * direction:
+                return move
+        raise ValueError(f"Illegal move '{san}'")
+
+    match = SAN_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid move '{san}'")
+
+    piece_type, from_file, from_rank, destination, promotion = match.groups()
+    piece_type = piece_type or 'P'
+    end_row, end_col = position.square_notation_to_coord(destination)
+    start_col = COLUMN_LETTERS.index(from_file) if from_file else None
+    start_row = 8 - int(from_rank) if from_rank else None
+
+    candidates = []
+    for move in legal_moves:
+        move_start_row, move_start_col, move_end_row, move_end_col, move_promotion = move
+        if (move_end_row, move_end_col) != (end_row, end_col):
+            continue
+        if position.piece_at(move_start_row, move_start_col).upper() != piece_type:
+            continue
+        if start_col is not None and move_start_col != start_col:
+            continue
+        if start_row is not None and move_start_row != start_row:
+            continue
+        if (move_promotion or '').upper() != (promotion or '').upper():
+            continue
+        candidates.append(move)
+
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move '{san}'")
+
+    return candidates[0]
+
+
+def parse_movetext(movetext):
+    """
+    Splits the moves of a game into its main line of SAN moves and its result,
+    skipping move numbers, comments, NAGs ($1, $2, ...) and variations.
+    """
+    san_moves = []
+    result = '*'
+    variation_depth = 0
+
+    for token in TOKEN_PATTERN.findall(movetext):
+        if token == '(':
+            variation_depth += 1
+        elif token == ')':
+            variation_depth = max(variation_depth - 1, 0)
+        elif variation_depth or token[0] in '{;$':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            # Move numbers may be written apart ('1. e4') or joined to the move ('1.e4', '12...Nf6')
+            token = MOVE_NUMBER_PATTERN.sub('', token)
+            if token:
+                san_moves.append(token)
+
+    return san_moves, result
+
+
+def read_games(lines):
+    """
+    Yields the games of a PGN file one at a time from an iterable of lines (e.g. an open file),
+    so databases of any size are read in constant memory.
+    """
+    headers = {}
+    movetext = []
+    in_comment = False  # Whether a {...} comment continues from a previous line
+
+    for line in lines:
+        stripped = line.strip()
+
+        if not in_comment and stripped.startswith('['):
+            # A tag pair after the moves starts the next game
+            if movetext:
+                yield PGNGame(headers, *parse_movetext('\n'.join(movetext)))
+                headers = {}
+                movetext = []
+
+            match = TAG_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+
+        elif stripped and (in_comment or not stripped.startswith('%')):
+            movetext.append(stripped)
+
+            # Track comments spanning several lines, so lines inside them are not taken for tag pairs
+            for character in stripped:
+                if character == '{':
+                    in_comment = True
+                elif character == '}':
+                    in_comment = False
+
+    if headers or movetext:
+        yield PGNGame(headers, *parse_movetext('\n'.join(movetext)))
+
+
+def game_result(position):
+    """
+    Returns the PGN result of a position that ends the game (checkmate or a draw), otherwise '*'.
+    """
+    return position.check_for_outcome().result
+
+
+def write_game(uci_moves, headers=None, start_fen=STARTING_FEN, line_length=79):
+    """
+    Returns the PGN text of a game given as UCI moves (e.g. Chessboard.uci_moves), with its moves in SAN.
+    Missing tags of the seven tag roster are filled with '?', and the result comes from the final position if not given.
+    """
+    position = Position(start_fen)
+
+    tokens = []
+    for uci_move in uci_moves:
+        move = position.uci_to_move(uci_move)
+        legal_moves = position.current_legal_moves()
+        if move not in legal_moves:
+            raise ValueError(f"Illegal move '{uci_move}'")
+
+        # Move numbers are written before white's moves, and before black's first move if black starts
+        if position.current_player == 'w':
+            tokens.append(f'{position.fullmove_number}.')
+        elif not tokens:
+            tokens.append(f'{position.fullmove_number}...')
+
+        tokens.append(move_to_san(position, move, legal_moves))
+        position.play_move(move)
+
+    headers = dict(headers or {})
+    result = headers.get('Result') or game_result(position)
+    headers['Result'] = result
+    if start_fen != STARTING_FEN:
+        headers.setdefault('SetUp', '1')
+        headers.setdefault('FEN', start_fen)
+
+    tag_names = SEVEN_TAG_ROSTER + [name for name in headers if name not in SEVEN_TAG_ROSTER]
+    default_values = {'Date': '????.??.??'}
+    lines = []
+    for name in tag_names:
+        value = str(headers.get(name, default_values.get(name, '?')))
+        value = value.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'[{name} "{value}"]')
+    lines.append('')
+
+    # Wrap the movetext so no line is longer than line_length
+    line = ''
+    for token in tokens + [result]:
+        if line and len(line) + 1 + len(token) > line_length:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PGN parsing benchmark: reads every game of a PGN file and replays its moves")
+    parser.add_argument("path", nargs='?', default=REFERENCE_FILE, help="PGN file to read (default: the reference games)")
+    parser.add_argument("--repeat", type=int, default=1, help="read the file this many times, for stable timings on small files")
+    parser.add_argument("--parse-only", action='store_true', help="only split the games into moves, without replaying them")
+    args = parser.parse_args()
+
+    game_count = 0
+    move_count = 0
+    errors = 0
+
+    start_time = time.perf_counter()
+    for _ in range(args.repeat):
+        with open(args.path, encoding='utf-8', errors='replace') as file:
+            for game in read_games(file):
+                game_count += 1
+                move_count += len(game.san_moves)
+                if args.parse_only:
+                    continue
+                try:
+                    game.uci_moves()
+                except ValueError as error:
+                    errors += 1
+                    print(f"Game {game_count}: {error}", file=sys.stderr)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"{game_count} games, {move_count} moves in {elapsed:.3f}s "
+          f"({game_count / max(elapsed, 1e-9):.1f} games/s, {move_count / max(elapsed, 1e-9):.0f} moves/s), {errors} errors")
+
+
+if __name__ == "__main__":
+    main()
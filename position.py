@@ -0,0 +1,824 @@
+import re
+
+from bitboard import *
+from zobrist import *
+
+
+# The rule engine only depends on the bitboard and hashing tables, never on pygame or the piece images,
+# so that positions can be set up, played and judged in processes without a display
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+COLUMN_LETTERS = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+
+PROMOTION_PIECES = ['q', 'r', 'b', 'n']
+
+# A move in UCI notation: start square, end square and an optional promotion piece (e.g. 'e2e4', 'e7e8q')
+UCI_MOVE_PATTERN = re.compile(r'[a-h][1-8][a-h][1-8][qrbn]?')
+
+# The (row, col) squares and pieces each castling right needs, the king and the rook it castles with
+CASTLING_PIECES = {
+    'K': (((7, 4), 'K'), ((7, 7), 'R')),
+    'Q': (((7, 4), 'K'), ((7, 0), 'R')),
+    'k': (((0, 4), 'k'), ((0, 7), 'r')),
+    'q': (((0, 4), 'k'), ((0, 0), 'r')),
+}
+
+# Translation of the digits in a FEN piece placement to that many empty squares, written as spaces
+EMPTY_SQUARE_RUNS = str.maketrans({str(count): ' ' * count for count in range(1, CHESSBOARD_SIZE + 1)})
+
+FEN_SQUARE_CHARACTERS = set(PIECE_NOTATIONS) | {' '}
+
+# The squares a FEN can give as the en passant square, for each side to move
+EN_PASSANT_SQUARES = {
+    'w': {column_letter + '6' for column_letter in COLUMN_LETTERS},
+    'b': {column_letter + '3' for column_letter in COLUMN_LETTERS},
+}
+
+# Castling rights (FEN notation) lost when a piece moves from or is captured on these (row, col) squares
+CASTLING_SQUARES = {
+    (7, 4): 'KQ',
+    (7, 7): 'K',
+    (7, 0): 'Q',
+    (0, 4): 'kq',
+    (0, 7): 'k',
+    (0, 0): 'q',
+}
+
+# The message shown to the players for each way a game can end
+TERMINATION_MESSAGES = {
+    'checkmate': 'Checkmate! Game Over',
+    'stalemate': 'Draw - Stalemate',
+    'insufficient_material': 'Draw - Insufficient Material',
+    'fifty_moves': 'Draw - Fifty Move Rule',
+    'threefold_repetition': 'Draw - Threefold Repetition',
+}
+
+
+class Outcome:
+
+    __slots__ = ('termination', 'result', 'in_check', 'legal_moves', 'move_map')
+
+    def __init__(self, termination, result, in_check, legal_moves):
+        """
+        The state of the game in a position, as returned by Position.check_for_outcome: how the game ended
+        (a TERMINATION_MESSAGES key, or None while it goes on), its PGN result ('1-0', '0-1', '1/2-1/2' or '*'),
+        whether the player to move is in check and the legal moves of the player to move.
+        """
+        self.termination = termination
+        self.result = result
+        self.in_check = in_check
+        self.legal_moves = legal_moves  # A tuple, shared by every user of the cached outcome
+        self.move_map = None  # The legal moves by start and end square, built by Position.legal_move_map when first needed
+
+
+    @property
+    def is_game_over(self):
+        """
+        Checks if the game has ended in this position.
+        """
+        return self.termination is not None
+
+
+    @property
+    def message(self):
+        """
+        Returns the message to show the players (game over or check), or None if there is nothing to announce.
+        """
+        if self.termination is not None:
+            return TERMINATION_MESSAGES[self.termination]
+        return "Opponent's king is in check!" if self.in_check else None
+
+
+class Position:
+
+    def __init__(self, fen=STARTING_FEN):
+        """
+        Initializes the rule engine state, set up from a FEN string (default: the starting position).
+        """
+        self.squares = bytearray(CHESSBOARD_SIZE * CHESSBOARD_SIZE)  # The piece code on each square (EMPTY if empty), 64 bytes
+        self.bitboards = Bitboards()  # The same pieces as bitboards, used for move generation and attacks
+        self.current_player = 'w'  # 'w' for white, 'b' for black
+        self.castling_rights = 'KQkq'  # Remaining castling rights in FEN notation
+        self.en_passant_square = None  # The square skipped over by a pawn double move on the previous turn
+        self.halfmove_clock = 0  # Moves (plies) since the last pawn move or capture, for the fifty move rule
+        self.fullmove_number = 1  # Starts at 1 and is incremented after each black move
+        self.move_history = []  # The (move, undo_info) pairs of the moves played, used to take moves back
+        self.start_fen = fen  # The position the move history starts from
+        self.position_hash = 0  # Zobrist hash of the position, updated incrementally by make_move
+        self.position_counts = {}  # How many times each position hash has occurred in the game, for threefold repetition
+        self.outcome_cache = {}  # Position hash -> Outcome of the position itself (legal moves, check, mate, stalemate)
+
+        # Only set up the rule state here, subclasses refresh their own views when set_fen is called on them
+        Position.set_fen(self, fen)
+
+
+    def set_fen(self, fen):
+        """
+        Sets up the position from a FEN (Forsyth-Edwards Notation) string and clears the move history.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: '{fen}'")
+
+        placement, active_color, castling_rights, en_passant = fields[:4]
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+        # Expand the digits (runs of empty squares) to one character per square, rank by rank
+        ranks = placement.translate(EMPTY_SQUARE_RUNS).split('/')
+        if len(ranks) != CHESSBOARD_SIZE or any(len(rank) != CHESSBOARD_SIZE for rank in ranks):
+            raise ValueError(f"Invalid FEN piece placement: '{placement}'")
+
+        board_string = ''.join(ranks)
+        if not set(board_string) <= FEN_SQUARE_CHARACTERS:
+            raise ValueError(f"Invalid FEN piece placement: '{placement}'")
+
+        self.squares = bytearray(board_string.encode().translate(FEN_TO_CODES))
+        self.bitboards = Bitboards.from_squares(self.squares)
+
+        if active_color not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN active color: '{active_color}'")
+        self.current_player = active_color
+
+        # Keep the castling rights in the canonical 'KQkq' order, dropping placeholders and rights whose king or rook has moved
+        self.castling_rights = ''.join(
+            castling_right for castling_right in 'KQkq'
+            if castling_right in castling_rights
+            and all(self.squares[square_index(*square)] == PIECE_CODES[notation] for square, notation in CASTLING_PIECES[castling_right])
+        )
+
+        # The en passant square is behind a pawn that just moved two squares: on the 6th rank when white is to move, the 3rd for black
+        if en_passant != '-' and en_passant not in EN_PASSANT_SQUARES[active_color]:
+            raise ValueError(f"Invalid FEN en passant square: '{en_passant}'")
+        self.en_passant_square = None if en_passant == '-' else self.square_notation_to_coord(en_passant)
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.move_history = []
+        self.start_fen = fen
+
+        # Hash the position and count it as the first occurrence
+        self.position_hash = zobrist_hash(self.bitboards, self.current_player, self.castling_rights, self.en_passant_square)
+        self.position_counts = {self.position_hash: 1}
+        self.outcome_cache = {}
+
+
+    def to_fen(self):
+        """
+        Returns the FEN (Forsyth-Edwards Notation) string of the position, generated from the position state.
+        The FEN is canonical: castling rights are written in 'KQkq' order and the en passant square only when
+        the side to move can capture on it, so the same position always gives the same FEN.
+        """
+        # Write the squares rank by rank, then replace the runs of empty squares (longest first) by their length
+        board_string = self.squares.translate(CODES_TO_FEN).decode()
+        placement = '/'.join([board_string[start:start + CHESSBOARD_SIZE] for start in range(0, len(board_string), CHESSBOARD_SIZE)])
+        for count in range(CHESSBOARD_SIZE, 0, -1):
+            placement = placement.replace(' ' * count, str(count))
+
+        en_passant_square = self.find_capturable_en_passant_square()
+        en_passant = self.coord_to_square_notation(en_passant_square) if en_passant_square else '-'
+
+        return f"{placement} {self.current_player} {self.castling_rights or '-'} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+
+    def find_capturable_en_passant_square(self):
+        """
+        Returns the en passant square if a pawn of the side to move can capture on it, otherwise None.
+        """
+        if self.en_passant_square is None:
+            return None
+
+        if self.bitboards.en_passant_capturers(square_index(*self.en_passant_square), self.current_player):
+            return self.en_passant_square
+
+        return None
+
+
+    def copy(self):
+        """
+        Returns an independent copy of the rule state (a plain Position, without any view of a subclass),
+        for searches and worker threads that must not change the game being played.
+        """
+        position = Position.__new__(Position)
+        position.squares = bytearray(self.squares)
+        position.bitboards = self.bitboards.copy()
+        position.current_player = self.current_player
+        position.castling_rights = self.castling_rights
+        position.en_passant_square = self.en_passant_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.move_history = self.move_history.copy()
+        position.start_fen = self.start_fen
+        position.position_hash = self.position_hash
+        position.position_counts = self.position_counts.copy()
+        position.outcome_cache = {}
+        return position
+
+
+    def put_piece(self, square, notation):
+        """
+        Places a piece on an empty square.
+        """
+        self.squares[square] = PIECE_CODES[notation]
+        self.bitboards.add_piece(square, notation)
+
+
+    def take_piece(self, square):
+        """
+        Removes the piece on the square and returns its notation.
+        """
+        notation = CODE_NOTATIONS[self.squares[square]]
+        self.squares[square] = EMPTY
+        self.bitboards.remove_piece(square, notation)
+        return notation
+
+
+    def piece_at(self, row, col):
+        """
+        Returns the notation of the piece at (row, col), or None if the square is empty.
+        """
+        return CODE_NOTATIONS[self.squares[square_index(row, col)]]
+
+
+    def coord_to_square_notation(self, coord):
+        """
+        Converts coordinates (x, y) to chess square notation (e.g., 'a1', 'b2').
+        """
+        x, y = coord
+        return COLUMN_LETTERS[y] + str(8 - x)
+
+
+    def square_notation_to_coord(self, square_notation):
+        """
+        Converts chess square notation (e.g., 'a1', 'b2') to coordinates (x, y).
+        """
+        x = COLUMN_LETTERS.index(square_notation[0])
+        y = 8 - int(square_notation[1])
+        return y, x
+
+
+    def uci_to_move(self, uci_move):
+        """
+        Converts a move in UCI notation (e.g., 'e2e4', 'e7e8q') to a (start_row, start_col, end_row, end_col, promotion) move.
+        The promotion piece is given in the notation of the moving pawn's color, as in the generated moves.
+        Raises ValueError if the text is not a UCI move (it does not check that the move is legal).
+        """
+        if not isinstance(uci_move, str) or UCI_MOVE_PATTERN.fullmatch(uci_move) is None:
+            raise ValueError(f"Invalid UCI move '{uci_move}'")
+
+        # Extract source (selected) row and column from the first two characters of the UCI move
+        selected_row, selected_col = self.square_notation_to_coord(uci_move[0:2])
+
+        # Extract destination row and column from the next two characters of the UCI move
+        row, col = self.square_notation_to_coord(uci_move[2:4])
+
+        # A fifth character is the promotion piece, white promotes to uppercase pieces
+        promotion = None
+        if len(uci_move) > 4:
+            notation = self.piece_at(selected_row, selected_col)
+            promotion = uci_move[4].upper() if notation and notation.isupper() else uci_move[4].lower()
+
+        return selected_row, selected_col, row, col, promotion
+
+
+    def move_tuple_to_uci(self, move):
+        """
+        Converts a (start_row, start_col, end_row, end_col, promotion) move to UCI notation (e.g., 'e2e4', 'e7e8q').
+        """
+        start_row, start_col, end_row, end_col, promotion = move
+        uci_move = self.coord_to_square_notation((start_row, start_col)) + self.coord_to_square_notation((end_row, end_col))
+        return uci_move + promotion.lower() if promotion else uci_move
+
+
+    def check_for_outcome(self):
+        """
+        Returns the Outcome of the current position: whether the game is over and how, whether the player to move is in check,
+        and their legal moves. The legal moves are generated once per position and every ending that only depends on the
+        position (checkmate, stalemate, insufficient material) is derived from them and cached on the position hash,
+        so the GUI, the move highlighting and the analysis all share one result. The fifty move and threefold repetition
+        draws depend on the game history and are checked on top of the cached outcome.
+        """
+        outcome = self.outcome_cache.get(self.position_hash)
+        if outcome is None:
+            outcome = self.outcome_cache[self.position_hash] = self.find_position_outcome()
+
+        if outcome.termination is None:
+            if self.check_for_fifty_moves():
+                return Outcome('fifty_moves', '1/2-1/2', outcome.in_check, outcome.legal_moves)
+            if self.check_for_threefold_repetition():
+                return Outcome('threefold_repetition', '1/2-1/2', outcome.in_check, outcome.legal_moves)
+
+        return outcome
+
+
+    def find_position_outcome(self):
+        """
+        Works out the Outcome of the position itself from one pass of the legal move generator:
+        no legal moves is checkmate when in check and stalemate otherwise.
+        """
+        # The turn has already passed to the opponent of the player who moved
+        color = self.current_player
+        legal_moves = tuple(self.iterate_legal_moves(color))
+
+        king_position = self.find_king_position(color)
+        in_check = king_position is not None and self.check_for_check(king_position, color)
+
+        if not legal_moves:
+            if in_check:
+                return Outcome('checkmate', '0-1' if color == 'w' else '1-0', True, legal_moves)
+            return Outcome('stalemate', '1/2-1/2', False, legal_moves)
+
+        if self.check_for_insufficient_material():
+            return Outcome('insufficient_material', '1/2-1/2', in_check, legal_moves)
+
+        return Outcome(None, '*', in_check, legal_moves)
+
+
+    def current_legal_moves(self):
+        """
+        Returns the legal moves of the player to move as a tuple, from the outcome cached for the position.
+        """
+        return self.check_for_outcome().legal_moves
+
+
+    def legal_move_map(self):
+        """
+        Returns the legal moves of the player to move as {(start_row, start_col): {(end_row, end_col): move}},
+        built once per position and kept with its cached outcome, so checking a clicked move is two dictionary lookups.
+        A promotion maps to one of its moves (the piece is chosen afterwards). Castling maps from the king to its end square,
+        and can also be selected by clicking the king and the rook it castles with, in either order.
+        """
+        self.check_for_outcome()
+        outcome = self.outcome_cache[self.position_hash]
+
+        if outcome.move_map is None:
+            move_map = {}
+            for move in outcome.legal_moves:
+                start_row, start_col, end_row, end_col, _ = move
+                move_map.setdefault((start_row, start_col), {}).setdefault((end_row, end_col), move)
+
+                # A castling move is the king moving two squares towards the rook it castles with
+                if abs(end_col - start_col) == 2 and self.squares[square_index(start_row, start_col)] & PIECE_TYPE_MASK == KING:
+                    rook_col = CHESSBOARD_SIZE - 1 if end_col > start_col else 0
+                    move_map[(start_row, start_col)].setdefault((start_row, rook_col), move)
+                    move_map.setdefault((start_row, rook_col), {})[(start_row, start_col)] = move
+
+            outcome.move_map = move_map
+
+        return outcome.move_map
+
+
+    def check_for_check(self, king_position, king_color):
+        """
+        Checks if the king of the specified color is under attack by any of the opponent's pieces.
+        """
+        opponent_color = 'b' if king_color == 'w' else 'w'
+
+        # Check if any of the opponent's pieces attacks the king's square
+        return self.is_square_attacked(king_position, opponent_color)
+
+
+    def is_square_attacked(self, square, by_color):
+        """
+        Checks if the (row, col) square is attacked by any piece of the specified color.
+        """
+        return self.bitboards.is_square_attacked(square_index(*square), by_color)
+
+
+    def check_for_insufficient_material(self):
+        """
+        Checks if there is insufficient material for either side to checkmate the opponent.
+        """
+        pieces = self.bitboards.pieces
+
+        # Each side may only have its king and at most one bishop or knight left
+        for pawn, knight, bishop, rook, queen, king in ('PNBRQK', 'pnbrqk'):
+            if pieces[pawn] or pieces[rook] or pieces[queen]:
+                return False  # Sufficient material
+            if bin(pieces[knight] | pieces[bishop] | pieces[king]).count('1') > 2:
+                return False  # Sufficient material
+
+        return True  # Insufficient material
+
+
+    def check_for_fifty_moves(self):
+        """
+        Checks if there have been 50 consecutive moves by each player without any pawn move or capture.
+        """
+        # The halfmove clock counts the moves of both players, so fifty moves each is 100
+        return self.halfmove_clock >= 100
+
+
+    def check_for_threefold_repetition(self):
+        """
+        Checks if the current position has occurred three or more times in the game, using the position hash counts.
+        """
+        return self.position_counts.get(self.position_hash, 0) >= 3
+
+
+    def move_exposes_own_king_to_check(self, start_row, start_col, end_row, end_col, promotion=None):
+        """
+        Checks if a move from the start position to the end position exposes the player's king to check.
+        """
+        player_king_color = 'b' if self.squares[square_index(start_row, start_col)] & BLACK else 'w'
+        opponent_color = 'b' if player_king_color == 'w' else 'w'
+
+        # Play the move in place, look for an attack on the king and then take the move back
+        move = (start_row, start_col, end_row, end_col, promotion)
+        undo_info = self.make_move(move)
+
+        king_square = self.bitboards.king_square(player_king_color)
+        exposed = king_square is not None and self.bitboards.is_square_attacked(king_square, opponent_color)
+
+        self.unmake_move(move, undo_info)
+
+        return exposed
+
+
+    def find_king_position(self, color):
+        """
+        Finds the position of the king of the specified color on the chessboard.
+        """
+        king_square = self.bitboards.king_square(color)
+
+        # If the king of the specified color is not found, return None
+        return square_coord(king_square) if king_square is not None else None
+
+
+    def generate_legal_moves(self, color):
+        """
+        Generates all legal moves for the specified color as (start_row, start_col, end_row, end_col, promotion) tuples.
+        """
+        return list(self.iterate_legal_moves(color))
+
+
+    def has_legal_moves(self, color):
+        """
+        Checks if the specified color has at least one legal move, stopping at the first one found
+        unless the legal moves of the position are already cached.
+        """
+        outcome = self.outcome_cache.get(self.position_hash) if color == self.current_player else None
+        if outcome is not None:
+            return bool(outcome.legal_moves)
+        return next(self.iterate_legal_moves(color), None) is not None
+
+
+    def iterate_legal_moves(self, color):
+        """
+        Yields the pseudo-legal moves that do not leave the player's own king in check.
+        The checkers and pins are found once for the position, so most moves are checked with a mask test
+        and only king moves and en passant captures need more work.
+        """
+        bitboards = self.bitboards
+        king_square = bitboards.king_square(color)
+
+        # Without a king on the board there is nothing a move could expose
+        if king_square is None:
+            yield from self.generate_pseudo_legal_moves(color)
+            return
+
+        opponent_color = 'b' if color == 'w' else 'w'
+        checkers = bitboards.attackers_to(king_square, opponent_color)
+
+        # Out of check any destination is allowed, in check a move must capture the checker or block it,
+        # and in double check only the king can move
+        if not checkers:
+            check_mask = ~0
+        elif checkers & (checkers - 1):
+            check_mask = 0
+        else:
+            check_mask = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+
+        pins = bitboards.pinned_pieces(king_square, color)
+        occupied_without_king = bitboards.occupied ^ 1 << king_square
+        en_passant_square = self.find_en_passant_square(color)
+
+        for move in self.generate_pseudo_legal_moves(color):
+            start_row, start_col, end_row, end_col, promotion = move
+            start_square = square_index(start_row, start_col)
+            end_square = square_index(end_row, end_col)
+
+            if start_square == king_square:
+                # Castling moves are already checked for attacked squares when they are generated,
+                # other king moves must not end on a square attacked once the king has left its square
+                if abs(end_col - start_col) == 2 or not bitboards.is_square_attacked(end_square, opponent_color, occupied_without_king):
+                    yield move
+            elif (end_row, end_col) == en_passant_square and self.squares[start_square] & PIECE_TYPE_MASK == PAWN:
+                # En passant removes two pieces from the same rank, which the pins above do not cover
+                if not self.move_exposes_own_king_to_check(*move):
+                    yield move
+            elif check_mask >> end_square & 1 and (start_square not in pins or pins[start_square] >> end_square & 1):
+                yield move
+
+
+    def generate_pseudo_legal_moves(self, color):
+        """
+        Generates all moves for the specified color that follow the piece movement rules,
+        without checking if they leave the player's own king in check.
+        """
+        bitboards = self.bitboards
+        occupied = bitboards.occupied
+        own_pieces = bitboards.occupancy[color]
+
+        moves = []
+
+        # Pawns have their own move rules
+        for square in iterate_squares(bitboards.pieces['P' if color == 'w' else 'p']):
+            moves.extend(self.generate_pawn_moves(*square_coord(square), color))
+
+        # Loop through the bitboard of each of the player's other piece types
+        for notation in ('NBRQK' if color == 'w' else 'nbrqk'):
+            attacks = PIECE_TYPE_ATTACKS[PIECE_CODES[notation] & PIECE_TYPE_MASK]
+            for square in iterate_squares(bitboards.pieces[notation]):
+                row, col = square_coord(square)
+
+                # Pieces can move to any attacked square that is not occupied by the player's own pieces
+                targets = attacks(square, occupied) & ~own_pieces
+                for target in iterate_squares(targets):
+                    moves.append((row, col) + square_coord(target) + (None,))
+
+        # Castling moves are already checked for attacked squares when they are generated
+        moves.extend(self.generate_castling_moves(color))
+
+        moves.extend(self.generate_en_passant_moves(color))
+
+        return moves
+
+
+    def generate_pawn_moves(self, row, col, color):
+        """
+        Generates the forward moves, double moves, captures and promotions for the pawn at (row, col).
+        """
+        bitboards = self.bitboards
+        occupied = bitboards.occupied
+        opponent_color = 'b' if color == 'w' else 'w'
+
+        square = square_index(row, col)
+        step = CHESSBOARD_SIZE if color == 'b' else -CHESSBOARD_SIZE
+        start_row = 1 if color == 'b' else 6
+        last_row = 7 if color == 'b' else 0
+
+        # Pawn captures diagonally
+        targets = PAWN_ATTACKS[color][square] & bitboards.occupancy[opponent_color]
+
+        # Pawn moves forward, or two squares forward on its first move
+        forward_square = square + step
+        if 0 <= forward_square < CHESSBOARD_SIZE * CHESSBOARD_SIZE and not occupied >> forward_square & 1:
+            targets |= 1 << forward_square
+            if row == start_row and not occupied >> (forward_square + step) & 1:
+                targets |= 1 << (forward_square + step)
+
+        moves = []
+        for target in iterate_squares(targets):
+            end_row, end_col = square_coord(target)
+
+            # A pawn reaching the last rank creates one move per promotion piece
+            if end_row == last_row:
+                for promotion in PROMOTION_PIECES:
+                    moves.append((row, col, end_row, end_col, promotion.upper() if color == 'w' else promotion))
+            else:
+                moves.append((row, col, end_row, end_col, None))
+
+        return moves
+
+
+    def generate_castling_moves(self, color):
+        """
+        Generates the castling moves for the specified color, given as the king moving two squares.
+        """
+        bitboards = self.bitboards
+        back_row = 7 if color == 'w' else 0
+        kingside, queenside = ('K', 'Q') if color == 'w' else ('k', 'q')
+
+        if kingside not in self.castling_rights and queenside not in self.castling_rights:
+            return []
+
+        # Castling is not allowed out of check
+        opponent_color = 'b' if color == 'w' else 'w'
+        if bitboards.is_square_attacked(square_index(back_row, 4), opponent_color):
+            return []
+
+        occupied = bitboards.occupied
+        moves = []
+
+        # (castling right, columns that must be empty, columns the king passes through)
+        for castling_right, empty_cols, king_cols in ((kingside, (5, 6), (5, 6)), (queenside, (1, 2, 3), (3, 2))):
+            if castling_right not in self.castling_rights:
+                continue
+
+            # Check if there are no pieces between the king and the rook
+            if any(occupied >> square_index(back_row, col) & 1 for col in empty_cols):
+                continue
+
+            # Check if the king passes through or ends up in an attacked square
+            if any(bitboards.is_square_attacked(square_index(back_row, col), opponent_color) for col in king_cols):
+                continue
+
+            moves.append((back_row, 4, back_row, king_cols[-1], None))
+
+        return moves
+
+
+    def generate_en_passant_moves(self, color):
+        """
+        Generates the en passant captures available to the specified color.
+        """
+        en_passant_square = self.find_en_passant_square(color)
+        if en_passant_square is None:
+            return []
+
+        pawns = self.bitboards.en_passant_capturers(square_index(*en_passant_square), color)
+
+        return [square_coord(start) + en_passant_square + (None,) for start in iterate_squares(pawns)]
+
+
+    def find_en_passant_square(self, color=None):
+        """
+        Finds the en passant square on the chessboard that the specified color (default: current player) can capture on.
+        """
+        if color is None:
+            color = self.current_player
+
+        # White captures en passant on the 6th rank (row 2) and black on the 3rd rank (row 5)
+        if self.en_passant_square and self.en_passant_square[0] == (2 if color == 'w' else 5):
+            return self.en_passant_square
+
+        return None  # No en passant square found
+
+
+    def perft(self, depth):
+        """
+        Counts the positions reached by every sequence of legal moves of the given depth,
+        used to test the correctness and speed of the move generation.
+        """
+        if depth == 0:
+            return 1
+
+        moves = self.generate_legal_moves(self.current_player)
+
+        # At the last ply each legal move is one position, so there is no need to play them
+        if depth == 1:
+            return len(moves)
+
+        nodes = 0
+        for move in moves:
+            undo_info = self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.unmake_move(move, undo_info)
+
+        return nodes
+
+
+    def divide(self, depth):
+        """
+        Returns the perft count below each legal move, keyed by the move in UCI notation.
+        """
+        results = {}
+        for move in self.generate_legal_moves(self.current_player):
+            undo_info = self.make_move(move)
+            results[self.move_tuple_to_uci(move)] = self.perft(depth - 1)
+            self.unmake_move(move, undo_info)
+
+        return results
+
+
+    def play_move(self, move):
+        """
+        Plays a move in the game, recording it in the move history and the repetition counts.
+        Returns the undo information of the move.
+        """
+        undo_info = self.make_move(move)
+        self.move_history.append((move, undo_info))
+
+        # Count the new position for threefold repetition
+        self.position_counts[self.position_hash] = self.position_counts.get(self.position_hash, 0) + 1
+
+        return undo_info
+
+
+    def take_back_move(self):
+        """
+        Takes back the last move played in the game, returning its (move, undo_info) pair, or None if there is none.
+        """
+        if not self.move_history:
+            return None
+
+        move, undo_info = self.move_history.pop()
+
+        # Remove the position being taken back from the repetition counts
+        self.position_counts[self.position_hash] -= 1
+        if not self.position_counts[self.position_hash]:
+            del self.position_counts[self.position_hash]
+
+        self.unmake_move(move, undo_info)
+
+        return move, undo_info
+
+
+    def make_move(self, move):
+        """
+        Applies a (start_row, start_col, end_row, end_col, promotion) move to the position in place and passes the turn.
+        Returns the undo information needed by unmake_move to restore the position exactly.
+        """
+        start_row, start_col, end_row, end_col, promotion = move
+        start_square = square_index(start_row, start_col)
+        end_square = square_index(end_row, end_col)
+
+        code = self.squares[start_square]
+        piece_type = code & PIECE_TYPE_MASK
+        notation = CODE_NOTATIONS[code]
+
+        # An en passant capture takes the pawn beside the destination square rather than on it
+        captured_square = end_square
+        if piece_type == PAWN and start_col != end_col and self.squares[end_square] == EMPTY:
+            captured_square = square_index(start_row, end_col)
+        captured_notation = CODE_NOTATIONS[self.squares[captured_square]]
+
+        # Store everything the move changes so that it can be restored exactly
+        undo_info = (
+            notation, captured_notation, captured_square,
+            self.castling_rights, self.en_passant_square, self.halfmove_clock, self.fullmove_number,
+            self.position_hash,
+        )
+
+        # Remove the old en passant file and castling rights from the hash, they are added back once updated
+        position_hash = self.position_hash ^ castling_key(self.castling_rights)
+        position_hash ^= en_passant_key(self.bitboards, self.current_player, self.en_passant_square)
+
+        # Update the pieces and the hash
+        if captured_notation:
+            self.take_piece(captured_square)
+            position_hash ^= ZOBRIST_PIECES[captured_notation][captured_square]
+
+        # A promoted pawn is replaced by the promotion piece
+        self.take_piece(start_square)
+        self.put_piece(end_square, promotion or notation)
+        position_hash ^= ZOBRIST_PIECES[notation][start_square] ^ ZOBRIST_PIECES[promotion or notation][end_square]
+
+        # Castling also moves the rook to the other side of the king
+        if piece_type == KING and abs(end_col - start_col) == 2:
+            rook_col, new_rook_col = (7, 5) if end_col > start_col else (0, 3)
+            rook_square, new_rook_square = square_index(start_row, rook_col), square_index(start_row, new_rook_col)
+            rook = self.take_piece(rook_square)
+            self.put_piece(new_rook_square, rook)
+            position_hash ^= ZOBRIST_PIECES[rook][rook_square] ^ ZOBRIST_PIECES[rook][new_rook_square]
+
+        # Moving the king or a rook, or capturing a rook, removes the matching castling rights
+        if self.castling_rights:
+            for square in ((start_row, start_col), (end_row, end_col)):
+                for castling_right in CASTLING_SQUARES.get(square, ''):
+                    self.castling_rights = self.castling_rights.replace(castling_right, '')
+
+        # A pawn double move allows an en passant capture on the square it skipped over
+        if piece_type == PAWN and abs(start_row - end_row) == 2:
+            self.en_passant_square = ((start_row + end_row) // 2, start_col)
+        else:
+            self.en_passant_square = None
+
+        # Reset the halfmove clock on a pawn move or capture, otherwise increment it. A new move number starts after black's move
+        self.halfmove_clock = 0 if piece_type == PAWN or captured_notation else self.halfmove_clock + 1
+        if self.current_player == 'b':
+            self.fullmove_number += 1
+
+        self.toggle_player_turn()
+
+        # Add the new castling rights, en passant file and side to move to the hash
+        position_hash ^= castling_key(self.castling_rights) ^ ZOBRIST_BLACK_TO_MOVE
+        self.position_hash = position_hash ^ en_passant_key(self.bitboards, self.current_player, self.en_passant_square)
+
+        return undo_info
+
+
+    def unmake_move(self, move, undo_info):
+        """
+        Takes back a move applied by make_move, restoring the position it was played from.
+        """
+        start_row, start_col, end_row, end_col, promotion = move
+        (
+            notation, captured_notation, captured_square,
+            self.castling_rights, self.en_passant_square, self.halfmove_clock, self.fullmove_number,
+            self.position_hash,
+        ) = undo_info
+
+        self.toggle_player_turn()
+
+        # Remove the moved (or promoted) piece and put the original piece back on its starting square
+        self.take_piece(square_index(end_row, end_col))
+        self.put_piece(square_index(start_row, start_col), notation)
+
+        if captured_notation:
+            self.put_piece(captured_square, captured_notation)
+
+        # Move the rook back to its corner after castling
+        if PIECE_CODES[notation] & PIECE_TYPE_MASK == KING and abs(end_col - start_col) == 2:
+            rook_col, new_rook_col = (7, 5) if end_col > start_col else (0, 3)
+            self.put_piece(square_index(start_row, rook_col), self.take_piece(square_index(start_row, new_rook_col)))
+
+
+    def toggle_player_turn(self):
+        """
+        Toggles the current player's turn between 'w' (white) and 'b' (black).
+        """
+        if self.current_player == 'w':
+            self.current_player = 'b'
+        else:
+            self.current_player = 'w'
@@ -0,0 +1,96 @@
+import pygame
+import os
+
+from config import *
+
+
+class SpriteCache:
+
+    def __init__(self, folder="assets"):
+        """
+        Initializes an empty cache of the piece images in the assets folder.
+        """
+        self.folder = folder
+        self.images = {}  # The full size image of each piece, keyed by piece notation
+        self.sprites = {}  # Scaled copies of the images keyed by (notation, size), and the move markers keyed by (kind, size)
+        self.square_size = SQUARE_SIZE  # The square size the board sprites are currently scaled for
+
+
+    def load(self):
+        """
+        Loads every piece image once, should be called at startup after the display mode is set.
+        """
+        for notation in PIECE_MAPPING:
+            self.images[notation] = self.load_image(notation)
+
+        # Any sprites scaled from images loaded before the display existed are rebuilt from the converted images
+        self.sprites = {}
+
+
+    def load_image(self, notation):
+        """
+        Loads the image of a piece from the assets folder, converted to the display format when there is one.
+        """
+        image = pygame.image.load(os.path.join(self.folder, PIECE_MAPPING[notation]))
+
+        # Converted images blit much faster, but convert_alpha needs a display mode to be set
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+
+        return image
+
+
+    def image(self, notation):
+        """
+        Returns the full size image of the piece, loading it the first time it is needed.
+        """
+        if notation not in self.images:
+            self.images[notation] = self.load_image(notation)
+        return self.images[notation]
+
+
+    def sprite(self, notation, size):
+        """
+        Returns the image of the piece scaled to a size x size square, scaling it only the first time.
+        """
+        key = (notation, size)
+        if key not in self.sprites:
+            self.sprites[key] = pygame.transform.scale(self.image(notation), (size, size))
+        return self.sprites[key]
+
+
+    def board_sprite(self, notation):
+        """
+        Returns the image of the piece scaled to be drawn on a board square.
+        """
+        return self.sprite(notation, int(self.square_size * PIECE_SIZE_SCALE))
+
+
+    def move_marker(self, capture):
+        """
+        Returns the translucent marker drawn on a square the selected piece can move to:
+        a ring around a piece it can capture, a dot on an empty square. Each marker is rendered once per square size.
+        """
+        key = ('capture' if capture else 'move', self.square_size)
+        if key not in self.sprites:
+            marker = pygame.Surface((self.square_size, self.square_size), pygame.SRCALPHA)
+            center = (self.square_size // 2, self.square_size // 2)
+            if capture:
+                pygame.draw.circle(marker, MOVE_MARKER_COLOR, center, self.square_size // 2, max(self.square_size // 12, 2))
+            else:
+                pygame.draw.circle(marker, MOVE_MARKER_COLOR, center, self.square_size // 6)
+            self.sprites[key] = marker
+        return self.sprites[key]
+
+
+    def set_square_size(self, square_size):
+        """
+        Sets the size of the board squares, dropping the scaled sprites only if it has changed.
+        """
+        if square_size != self.square_size:
+            self.square_size = square_size
+            self.sprites = {}
+
+
+# Shared by the chessboard, the sidebar and the promotion dialog so each image is only loaded and scaled once
+SPRITES = SpriteCache()
@@ -0,0 +1,56 @@
+import os
+import sys
+
+from engine_pool import EnginePool
+from fake_uci import material_score
+
+
+# The fake engine reports the material balance, so every position has a known score without Stockfish
+FAKE_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_uci.py')
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnb1kbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnb1kbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR b KQkq - 0 1",
+    "4k3/8/8/8/8/8/8/R3K3 w - - 0 1",
+    "4k3/8/8/8/8/8/8/R3K3 b - - 0 1",
+    "r3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+]
+
+DEPTH = 3
+
+
+def fake_engine_command(*options):
+    """
+    Returns the command line starting the fake engine with a short delay per depth and the given options.
+    """
+    return [sys.executable, FAKE_ENGINE, '--delay', '0.001', *options]
+
+
+def analyse_all(pool):
+    """
+    Submits every test position and checks that each future resolves to the engine's final score.
+    """
+    futures = [pool.submit(fen, DEPTH) for fen in FENS]
+    for fen, future in zip(FENS, futures):
+        info = future.result(timeout=30)
+        assert info == {'depth': DEPTH, 'type': 'cp', 'value': material_score(fen)}
+
+
+def test_pool_scores_positions_in_parallel():
+    with EnginePool(fake_engine_command(), size=2, timeout=10) as pool:
+        analyse_all(pool)
+        assert pool.restarts == 0
+
+
+def test_pool_restarts_crashed_engines():
+    with EnginePool(fake_engine_command('--crash-after', '2'), size=2, timeout=10) as pool:
+        analyse_all(pool)
+        assert pool.restarts > 0
+
+
+def test_pool_restarts_hung_engines():
+    # The watchdog kills an engine that does not finish a position within the timeout
+    with EnginePool(fake_engine_command('--hang-after', '2'), size=2, timeout=1) as pool:
+        analyse_all(pool)
+        assert pool.restarts > 0
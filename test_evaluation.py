@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+
+from evaluation import EvaluationWorker
+from fake_uci import material_score
+from uci_engine import UCIEngine
+
+
+FAKE_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_uci.py')
+
+FIRST_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+SECOND_FEN = "rnb1kbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Seconds the fake engine spends on each depth, the first search would take DELAY * DEPTH to finish
+DELAY = 0.2
+DEPTH = 50
+
+
+def wait_for_result(worker, fen, timeout=10):
+    """
+    Waits for the first result of the position and returns it with the results of other positions received before it.
+    """
+    others = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = worker.latest_result()
+        if result is None:
+            time.sleep(0.01)
+        elif result[0] == fen:
+            return result[1], others
+        else:
+            others.append(result)
+    raise AssertionError(f'No evaluation of {fen} within {timeout} seconds')
+
+
+def test_submit_cancels_the_search_in_progress():
+    engine = UCIEngine([sys.executable, FAKE_ENGINE, '--delay', str(DELAY)])
+    worker = EvaluationWorker(lambda fen, cancelled: engine.analyse(fen, DEPTH, cancelled))
+    try:
+        worker.submit(FIRST_FEN)
+        wait_for_result(worker, FIRST_FEN)
+
+        submitted = time.monotonic()
+        worker.submit(SECOND_FEN)
+        info, others = wait_for_result(worker, SECOND_FEN)
+
+        # The old search is stopped at the next line the engine prints, so the new one starts
+        # after at most one more depth of it instead of running to DEPTH
+        assert others == []
+        assert info == {'depth': 1, 'type': 'cp', 'value': material_score(SECOND_FEN)}
+        assert time.monotonic() - submitted < 5 * DELAY
+    finally:
+        worker.stop()
+        engine.quit()
@@ -0,0 +1,129 @@
+from array import array
+
+
+# Bound types of a stored score
+EXACT = 0
+LOWER_BOUND = 1  # The real score is at least the stored score (the search failed high)
+UPPER_BOUND = 2  # The real score is at most the stored score (the search failed low)
+
+PROMOTION_CODES = ' qrbnQRBN'  # Index of the promotion piece in an encoded move, 0 for no promotion
+
+# Bytes used by one entry: key (8), score (4), best move (2), depth (1), bound (1) and age (1)
+ENTRY_SIZE = 17
+
+
+def encode_move(move):
+    """
+    Packs a (start_row, start_col, end_row, end_col, promotion) move into a 16-bit integer, 0 for no move.
+    """
+    if move is None:
+        return 0
+    start_row, start_col, end_row, end_col, promotion = move
+    return (start_row * 8 + start_col) | (end_row * 8 + end_col) << 6 | PROMOTION_CODES.index(promotion or ' ') << 12
+
+
+def decode_move(code):
+    """
+    Unpacks a move packed by encode_move, or returns None for no move.
+    """
+    if code == 0:
+        return None
+    start_row, start_col = divmod(code & 63, 8)
+    end_row, end_col = divmod(code >> 6 & 63, 8)
+    promotion = PROMOTION_CODES[code >> 12]
+    return start_row, start_col, end_row, end_col, None if promotion == ' ' else promotion
+
+
+class TranspositionTable:
+
+    def __init__(self, size_mb=16):
+        """
+        Allocates a fixed size table of search results keyed by position hash, within the given budget in megabytes.
+        Each bucket holds two entries: one kept for the deepest search and one always replaced by the newest.
+        """
+        self.bucket_count = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_SIZE))
+        entry_count = 2 * self.bucket_count
+
+        # One flat array per field, so the table never grows and each entry costs a few bytes instead of Python objects
+        self.keys = array('Q', bytes(8 * entry_count))
+        self.scores = array('i', bytes(4 * entry_count))
+        self.moves = array('H', bytes(2 * entry_count))
+        self.depths = array('b', [-1]) * entry_count  # -1 marks an empty entry
+        self.bounds = array('B', bytes(entry_count))
+        self.ages = array('B', bytes(entry_count))
+
+        self.age = 0  # Incremented for each new search, so entries from old searches can be replaced first
+        self.hits = 0
+        self.misses = 0
+        self.overwrites = 0
+
+
+    def new_search(self):
+        """
+        Marks the start of a new search, making the entries of previous searches replaceable.
+        """
+        self.age = (self.age + 1) & 255
+
+
+    def clear(self):
+        """
+        Empties the table and resets the statistics.
+        """
+        entry_count = 2 * self.bucket_count
+        self.depths = array('b', [-1]) * entry_count
+        self.hits = self.misses = self.overwrites = 0
+
+
+    def probe(self, key):
+        """
+        Returns the (depth, score, bound, best move) stored for the position hash, or None if it is not in the table.
+        """
+        index = 2 * (key % self.bucket_count)
+        for slot in (index, index + 1):
+            if self.depths[slot] >= 0 and self.keys[slot] == key:
+                self.hits += 1
+                return self.depths[slot], self.scores[slot], self.bounds[slot], decode_move(self.moves[slot])
+
+        self.misses += 1
+        return None
+
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Stores a search result. The first entry of the bucket keeps the deepest result of the current search
+        (or the same position), anything else goes to the second entry, which is always replaced.
+        """
+        index = 2 * (key % self.bucket_count)
+        if self.depths[index] < 0 or self.keys[index] == key or self.ages[index] != self.age or depth >= self.depths[index]:
+            slot = index
+        else:
+            slot = index + 1
+
+        if self.depths[slot] >= 0 and self.keys[slot] != key:
+            self.overwrites += 1
+
+        # Keep the best move already stored for the position if the new result does not have one
+        if move is None and self.depths[slot] >= 0 and self.keys[slot] == key:
+            encoded_move = self.moves[slot]
+        else:
+            encoded_move = encode_move(move)
+
+        self.keys[slot] = key
+        self.depths[slot] = min(depth, 127)
+        self.scores[slot] = score
+        self.bounds[slot] = bound
+        self.moves[slot] = encoded_move
+        self.ages[slot] = self.age
+
+
+    def stats(self):
+        """
+        Returns the hit, miss and overwrite counts and the fraction of entries in use.
+        """
+        used = sum(1 for depth in self.depths if depth >= 0)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'overwrites': self.overwrites,
+            'usage': used / len(self.depths),
+        }
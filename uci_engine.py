@@ -0,0 +1,139 @@
+import subprocess
+
+
+class EngineError(Exception):
+    """
+    Raised when the engine process stops responding or exits.
+    """
+
+
+def parse_info_line(line):
+    """
+    Parses a UCI 'info' line into {'depth': N, 'type': 'cp' or 'mate', 'value': V}, with the score
+    from the point of view of the side to move. Returns None for lines without a final score at a depth.
+    """
+    tokens = line.split()
+    if not tokens or tokens[0] != 'info' or 'score' not in tokens or 'depth' not in tokens:
+        return None
+
+    # Scores from a failed aspiration window are only bounds on the real score
+    if 'lowerbound' in tokens or 'upperbound' in tokens:
+        return None
+
+    try:
+        depth = int(tokens[tokens.index('depth') + 1])
+        score_index = tokens.index('score')
+        score_type = tokens[score_index + 1]
+        value = int(tokens[score_index + 2])
+    except (IndexError, ValueError):
+        return None
+
+    if score_type not in ('cp', 'mate'):
+        return None
+
+    return {'depth': depth, 'type': score_type, 'value': value}
+
+
+class UCIEngine:
+
+    def __init__(self, path, parameters=None):
+        """
+        Starts a UCI engine process (e.g. Stockfish) and sets its options.
+        The path can also be a full command line as a list, e.g. [sys.executable, 'fake_uci.py'].
+        """
+        command = list(path) if isinstance(path, (list, tuple)) else [path]
+        self.path = ' '.join(command)  # Shown in error messages
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, bufsize=1,
+        )
+
+        self.send('uci')
+        self.read_until('uciok')
+
+        for name, value in (parameters or {}).items():
+            self.send(f'setoption name {name} value {value}')
+
+        self.wait_ready()
+
+
+    def send(self, command):
+        """
+        Sends a command to the engine.
+        """
+        try:
+            self.process.stdin.write(command + '\n')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as error:
+            raise EngineError(f"Engine '{self.path}' is not running") from error
+
+
+    def read_line(self):
+        """
+        Reads the next line of output from the engine, waiting for it if needed.
+        """
+        line = self.process.stdout.readline()
+        if not line:
+            raise EngineError(f"Engine '{self.path}' exited")
+        return line.strip()
+
+
+    def read_until(self, prefix):
+        """
+        Reads lines until one starts with the prefix and returns it.
+        """
+        while True:
+            line = self.read_line()
+            if line.startswith(prefix):
+                return line
+
+
+    def wait_ready(self):
+        """
+        Waits until the engine has processed all the commands sent to it.
+        """
+        self.send('isready')
+        self.read_until('readyok')
+
+
+    def analyse(self, fen, depth, cancelled=None):
+        """
+        Searches the position up to the given depth, yielding the parsed score of each depth as soon as the engine reports it.
+        Closing the generator early stops the search, so a position that is no longer needed does not keep the engine busy.
+        cancelled is an optional threading.Event checked after every line read, so another thread can stop the search
+        without waiting for its next score.
+        """
+        self.send(f'position fen {fen}')
+        self.send(f'go depth {depth}')
+
+        finished = False
+        try:
+            while True:
+                line = self.read_line()
+                if line.startswith('bestmove'):
+                    finished = True
+                    return
+
+                if cancelled is not None and cancelled.is_set():
+                    return
+
+                info = parse_info_line(line)
+                if info is not None:
+                    yield info
+        finally:
+            # Stop the search and skip its remaining output so the next command starts from a clean state
+            if not finished and self.process.poll() is None:
+                self.send('stop')
+                self.read_until('bestmove')
+
+
+    def quit(self):
+        """
+        Asks the engine to exit, killing it if it does not.
+        """
+        if self.process.poll() is None:
+            try:
+                self.send('quit')
+                self.process.wait(timeout=1)
+            except (EngineError, subprocess.TimeoutExpired):
+                self.process.kill()
@@ -0,0 +1,56 @@
+import random
+
+from bitboard import CHESSBOARD_SIZE, PIECE_NOTATIONS, square_index
+
+
+# Random 64-bit keys, generated from a fixed seed so that hashes are the same every run
+_random = random.Random(20230801)
+
+ZOBRIST_PIECES = {notation: [_random.getrandbits(64) for _ in range(CHESSBOARD_SIZE * CHESSBOARD_SIZE)] for notation in PIECE_NOTATIONS}
+ZOBRIST_BLACK_TO_MOVE = _random.getrandbits(64)
+ZOBRIST_CASTLING = {castling_right: _random.getrandbits(64) for castling_right in 'KQkq'}
+ZOBRIST_EN_PASSANT = [_random.getrandbits(64) for _ in range(CHESSBOARD_SIZE)]
+
+
+def castling_key(castling_rights):
+    """
+    Returns the combined key of the castling rights (FEN notation, e.g. 'KQk').
+    """
+    key = 0
+    for castling_right in castling_rights:
+        key ^= ZOBRIST_CASTLING[castling_right]
+    return key
+
+
+def en_passant_key(bitboards, side_to_move, en_passant_square):
+    """
+    Returns the key of the en passant file, only if the side to move has a pawn that can capture en passant,
+    so that positions which only differ by an unusable en passant square hash the same.
+    """
+    if en_passant_square is None:
+        return 0
+
+    if bitboards.en_passant_capturers(square_index(*en_passant_square), side_to_move):
+        return ZOBRIST_EN_PASSANT[en_passant_square[1]]
+
+    return 0
+
+
+def zobrist_hash(bitboards, side_to_move, castling_rights, en_passant_square):
+    """
+    Computes the Zobrist hash of a position from scratch.
+    """
+    key = 0
+    for notation, bitboard in bitboards.pieces.items():
+        table = ZOBRIST_PIECES[notation]
+
+        # Walk the set bits directly, this runs for every position set up from a FEN
+        while bitboard:
+            lowest_bit = bitboard & -bitboard
+            key ^= table[lowest_bit.bit_length() - 1]
+            bitboard ^= lowest_bit
+
+    if side_to_move == 'b':
+        key ^= ZOBRIST_BLACK_TO_MOVE
+
+    return key ^ castling_key(castling_rights) ^ en_passant_key(bitboards, side_to_move, en_passant_square)